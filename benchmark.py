@@ -0,0 +1,497 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+# Synthetic holder data and a local stand-in for the SolanaFM, Helius RPC and Sanctum APIs, used to time every
+# stage of the fetch -> process -> plot pipeline (and the FastAPI handlers) without touching live APIs.
+#   python benchmark.py --accounts 10000,200000,2000000 --baseline benchmark_results/previous.json
+
+BASE58_ALPHABET = np.frombuffer(b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz", dtype='S1')
+RESULTS_DIR = "benchmark_results"
+DEFAULT_ACCOUNTS = [10000, 50000, 200000]
+MAX_PAGE_SIZE = 1000
+# A stage slower than its baseline by more than this factor is reported as a regression
+REGRESSION_FACTOR = 1.2
+
+def random_addresses(rng, count, length=44):
+    return BASE58_ALPHABET[rng.integers(0, len(BASE58_ALPHABET), (count, length))].view(f'S{length}').ravel()
+
+class SyntheticToken:
+    # One mint's token accounts as columns. Balances are log-normal with a Pareto tail of whales and
+    # a share of empty accounts; owners are drawn from a pool shared by every mint so that owners
+    # hold several tokens, as they do on chain.
+    def __init__(self, mint, accounts, rng, owner_pool, decimals=9):
+        self.mint = mint
+        self.decimals = decimals
+        # Mints are "BenchNN" padded with '1's, so the distinguishing digits are at the front
+        self.name = f"Bench {mint[5:7]}"
+        self.symbol = f"bench{mint[5:7]}"
+        self.price = int(rng.uniform(1.0, 1.3) * 1_000_000_000)
+        self.pubkeys = random_addresses(rng, accounts)
+        self.owners = owner_pool[rng.integers(0, len(owner_pool), accounts)]
+        balances = rng.lognormal(mean=-0.5, sigma=2.0, size=accounts)
+        whales = rng.random(accounts) < 0.002
+        balances[whales] += (rng.pareto(1.1, whales.sum()) + 1) * 1000
+        balances[rng.random(accounts) < 0.05] = 0
+        self.amounts = (balances * 10 ** decimals).astype(np.uint64)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def account(self, row):
+        amount = int(self.amounts[row])
+        ui_amount = amount / 10 ** self.decimals
+        return {
+            'pubkey': self.pubkeys[row].decode(),
+            'info': {
+                'isNative': False,
+                'mint': self.mint,
+                'owner': self.owners[row].decode(),
+                'state': 'initialized',
+                'tokenAmount': {'amount': str(amount), 'decimals': self.decimals,
+                                'uiAmount': ui_amount, 'uiAmountString': str(ui_amount)},
+            },
+        }
+
+    def holders_page(self, page, page_size):
+        start = (page - 1) * page_size
+        rows = range(start, min(start + page_size, len(self)))
+        return {'tokenAccounts': [self.account(row) for row in rows], 'totalItemCount': len(self)}
+
+    def rpc_accounts_page(self, cursor, limit):
+        # Helius getTokenAccounts result; the cursor is opaque to clients, here just the next row
+        start = int(cursor) if cursor else 0
+        rows = range(start, min(start + limit, len(self)))
+        accounts = [{'address': self.pubkeys[row].decode(), 'mint': self.mint, 'owner': self.owners[row].decode(),
+                     'amount': int(self.amounts[row]), 'delegated_amount': 0, 'frozen': False} for row in rows]
+        result = {'total': len(accounts), 'limit': limit, 'token_accounts': accounts}
+        if accounts:
+            result['cursor'] = str(rows.stop)
+        return result
+
+    def metadata(self):
+        return {'mint': self.mint, 'name': self.name, 'symbol': self.symbol, 'decimals': self.decimals}
+
+    def write_accounts_file(self, path, chunk_rows=10000):
+        # SolanaFM-shaped {mint}_accounts.json, as the legacy fetcher wrote it
+        with open(path, 'w') as f:
+            f.write('[')
+            for start in range(0, len(self), chunk_rows):
+                rows = range(start, min(start + chunk_rows, len(self)))
+                f.write((',' if start else '') + ','.join(json.dumps(self.account(row)) for row in rows))
+            f.write(']')
+
+def generate_tokens(account_counts, seed=7):
+    rng = np.random.default_rng(seed)
+    owner_pool = random_addresses(rng, max(int(max(account_counts) * 1.2), 1000))
+    mints = [f"Bench{index:02d}".ljust(44, '1') for index in range(len(account_counts))]
+    return {mint: SyntheticToken(mint, count, rng, owner_pool) for mint, count in zip(mints, account_counts)}
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    # Mimics GET /v1/tokens/{mint}/holders?page=&pageSize= (SolanaFM) and
+    # GET /v1/metadata/{mint}, GET /v1/price?input=... (Sanctum) and
+    # POST /rpc with getTokenAccounts and getTokenSupply (Helius JSON-RPC), and
+    # GET /figures/{name} from the benchmark's figures directory with ETag revalidation (shdw-drive)
+    protocol_version = "HTTP/1.1"
+    tokens = {}
+    stats = None
+    # Share of holder page requests answered with a 429 (with Retry-After) or a 503, to exercise retries
+    fail_rate = 0.0
+    rpc_limit = 1000
+    figures_dir = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_failure(self, kind):
+        if not self.fail_rate or random.random() >= self.fail_rate:
+            return False
+        self.stats.record(f'{kind}_failed')
+        if random.random() < 0.5:
+            self.send_json(429, {'error': 'rate limited'}, {'Retry-After': '0'})
+        else:
+            self.send_json(503, {'error': 'unavailable'})
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        if len(parts) == 4 and parts[:2] == ['v1', 'tokens'] and parts[3] == 'holders' and parts[2] in self.tokens:
+            if self.inject_failure('holders'):
+                return
+            self.stats.record('holders')
+            page = int(query.get('page', ['1'])[0])
+            page_size = min(int(query.get('pageSize', [str(MAX_PAGE_SIZE)])[0]), MAX_PAGE_SIZE)
+            self.send_json(200, self.tokens[parts[2]].holders_page(page, page_size))
+        elif len(parts) == 3 and parts[:2] == ['v1', 'metadata'] and parts[2] in self.tokens:
+            self.stats.record('metadata')
+            self.send_json(200, self.tokens[parts[2]].metadata())
+        elif len(parts) == 2 and parts[0] == 'figures' and self.figures_dir:
+            self.send_figure(parts[1])
+        elif parts == ['v1', 'price']:
+            self.stats.record('price')
+            prices = [{'mint': mint, 'amount': str(self.tokens[mint].price)} for mint in query.get('input', []) if mint in self.tokens]
+            self.send_json(200, {'prices': prices})
+        else:
+            self.stats.record('not_found')
+            self.send_json(404, {'error': 'not found'})
+
+    def send_figure(self, name):
+        path = os.path.join(self.figures_dir, os.path.basename(name))
+        if not os.path.exists(path):
+            self.stats.record('figure_not_found')
+            self.send_json(404, {'error': 'not found'})
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.stats.record('figure_not_modified')
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.stats.record('figure')
+        self.send_response(200)
+        self.send_header("Content-Type", "image/webp")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if urlparse(self.path).path != '/rpc':
+            self.stats.record('not_found')
+            self.send_json(404, {'error': 'not found'})
+            return
+        method = body.get('method')
+        params = body.get('params')
+        if method == 'getTokenAccounts' and params.get('mint') in self.tokens:
+            if self.inject_failure('rpc_accounts'):
+                return
+            self.stats.record('rpc_accounts')
+            limit = min(int(params.get('limit', self.rpc_limit)), self.rpc_limit)
+            result = self.tokens[params['mint']].rpc_accounts_page(params.get('cursor'), limit)
+        elif method == 'getTokenSupply' and params and params[0] in self.tokens:
+            self.stats.record('rpc_supply')
+            token = self.tokens[params[0]]
+            supply = int(token.amounts.sum())
+            result = {'context': {'slot': 1}, 'value': {'amount': str(supply), 'decimals': token.decimals,
+                                                        'uiAmount': supply / 10 ** token.decimals}}
+        else:
+            self.stats.record('rpc_error')
+            self.send_json(200, {'jsonrpc': '2.0', 'id': body.get('id'), 'error': {'code': -32602, 'message': 'Invalid params'}})
+            return
+        self.send_json(200, {'jsonrpc': '2.0', 'id': body.get('id'), 'result': result})
+
+class RequestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, kind):
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+def serve_mock_api(tokens, host, port, connection, fail_rate=0.0, figures_dir=None):
+    handler = type("Handler", (MockApiHandler,), {'tokens': tokens, 'stats': RequestStats(), 'fail_rate': fail_rate,
+                                                  'figures_dir': figures_dir})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    connection.send(server.server_address[:2])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Blocks until the parent asks for the request counts, which also ends the server
+    connection.recv()
+    connection.send(dict(handler.stats.counts))
+    server.shutdown()
+
+class MockApiServer:
+    # Runs in its own process so serving pages does not compete with the measured stages for the GIL
+    def __init__(self, tokens, host="127.0.0.1", port=0, fail_rate=0.0, figures_dir=None):
+        self.tokens = tokens
+        self.fail_rate = fail_rate
+        self.figures_dir = figures_dir
+        self.host_name = host
+        self.port = port
+        self.address = None
+        self.request_counts = {}
+
+    @property
+    def url(self):
+        return f"http://{self.address[0]}:{self.address[1]}"
+
+    @property
+    def host(self):
+        return urlparse(self.url).netloc
+
+    def __enter__(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve_mock_api, args=(self.tokens, self.host_name, self.port, child, self.fail_rate, self.figures_dir), daemon=True)
+        self.process.start()
+        self.address = self.connection.recv()
+        return self
+
+    def wait(self):
+        self.process.join()
+
+    def __exit__(self, *exc):
+        if self.process.is_alive():
+            self.connection.send('stop')
+            self.request_counts = self.connection.recv()
+        self.process.join(timeout=5)
+
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, fn, *args, items=None, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        error = None
+        value = None
+        try:
+            value = fn(*args, **kwargs)
+        except Exception as e:
+            error = repr(e)
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        result = {'stage': stage, 'seconds': round(seconds, 4), 'peak_mb': None if peak is None else round(peak, 1)}
+        if items is not None:
+            result['items'] = items
+            result['items_per_second'] = round(items / seconds, 1) if seconds else None
+        if error:
+            result['error'] = error
+        self.results.append(result)
+        print(f"{stage:<40} {seconds:8.3f}s" + (f" {peak:9.1f}MB" if peak is not None else "")
+              + (f" {result.get('items_per_second', 0):12,.0f}/s" if items is not None else "") + (f"  ERROR {error}" if error else ""))
+        return value
+
+def run_pipeline(timer, tokens, server):
+    import checkpoints
+    import dashboard_build
+    import data_fetcher
+    import data_plotter
+    import holder_sources
+    import http_client
+    import token_api
+    import holder_index
+    mints = list(tokens)
+    total_accounts = sum(len(token) for token in tokens.values())
+
+    holder_sources.SOLANA_FM_URL = server.url
+    holder_sources.HELIUS_RPC_URL = f"{server.url}/rpc"
+    token_api.SANCTUM_URL = server.url
+    token_api.CACHE_DIR = os.path.abspath("token_api_cache")
+    # The production per-host limits would make the benchmark measure the rate limiter
+    rate_limits = {server.host: (10000, 10000)}
+    # Likewise the production backoff, when the mock injects failures
+    http_client.BACKOFF_BASE = 0.05
+
+    def fetch_from(source):
+        # Completed checkpoints would make the second source skip every mint
+        shutil.rmtree(checkpoints.CHECKPOINT_DIR, ignore_errors=True)
+        holder_sources.HOLDER_SOURCES = [source]
+        return asyncio.run(data_fetcher.fetch_all_token_accounts(mints, rate_limits=rate_limits))
+
+    timer.measure("fetch_all_token_accounts (helius)", fetch_from, "helius", items=total_accounts)
+    timer.measure("fetch_all_token_accounts", fetch_from, "solanafm", items=total_accounts)
+    timer.measure("load_and_process_json_files", data_fetcher.load_and_process_json_files, mints, items=total_accounts)
+    timer.measure("build_indexes", holder_index.build_indexes, ".", mints, items=total_accounts)
+
+    data = timer.measure("load_token_columns", data_plotter.load_token_columns, ".", items=total_accounts)
+    timer.measure("load_token_data", data_plotter.load_token_data, "token_data.json", items=total_accounts)
+    # Metadata was cached by the fetch above, so this measures a warm cache; prices need one request
+    metadata_results = timer.measure("fetch_token_metadata", token_api.fetch_metadata, mints)
+    prices = timer.measure("fetch_token_prices", token_api.fetch_prices, mints)
+    owner_matrix = timer.measure("aggregate_owner_data", data_plotter.aggregate_owner_data, data, items=total_accounts)
+    render_data = timer.measure("build_render_data", data_plotter.build_render_data, data, owner_matrix, metadata_results, prices, "figures")
+
+    # One timing per plot function; per-token plots use the largest mint
+    largest = max(mints, key=lambda mint: len(tokens[mint]))
+    seen = set()
+    for plot, token in data_plotter.build_render_jobs(render_data):
+        if plot in seen or (token is not None and token != largest):
+            continue
+        seen.add(plot)
+        timer.measure(f"plot:{plot}", data_plotter.render_job, render_data, (plot, token))
+    timer.measure("render_figures (pool, cold)", data_plotter.render_figures, render_data,
+                  data_plotter.build_render_jobs(render_data), use_cache=False)
+    timer.measure("build_dashboard", dashboard_build.build_dashboard, os.path.join("figures", data_plotter.MANIFEST_FILE),
+                  "/images/", os.path.abspath("dashboard"))
+
+def run_api(timer, tokens, server, directory, requests_per_endpoint=20):
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("fastapi is not installed; skipping the API handlers")
+        return
+    import timeseries
+    os.environ["SNAPSHOT_DIR"] = directory
+    os.environ["TIMESERIES_DIR"] = os.path.join(directory, "timeseries")
+    # One day of history per token, as the holders stage would record it; /history 404s without a series
+    date = datetime.now().strftime("%Y%m%d")
+    for mint, index in timeseries.directory_indexes(directory, list(tokens)).items():
+        timeseries.write_records(os.environ["TIMESERIES_DIR"], mint, [timeseries.build_record(date, index)])
+    os.environ["DASHBOARD_DIR"] = os.path.join(directory, "dashboard")
+    os.environ["FIGURES_ORIGIN"] = f"{server.url}/figures/"
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(directory, "image_cache")
+    app_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "optimisoor")
+    sys.path.insert(0, app_directory)
+    cwd = os.getcwd()
+    # Templates are resolved relative to the app directory
+    os.chdir(app_directory)
+    try:
+        import main
+        mint = max(tokens, key=lambda mint: len(tokens[mint]))
+        with TestClient(main.app) as client:
+            def get(path):
+                response = client.get(path)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{path} returned {response.status_code}")
+                return response
+
+            timer.measure("api: cold cache fill", get, "/api/tokens")
+            for path in ["/api/tokens", f"/api/tokens/{mint}/stats", f"/api/tokens/{mint}/histogram?bins=pet",
+                         f"/api/tokens/{mint}/histogram?edges=0.01,0.5,1,5,50,inf", f"/api/tokens/{mint}/history", "/dashboard", "/old-dashboard"]:
+                timer.measure(f"api: GET {path}", lambda: [get(path) for _ in range(requests_per_endpoint)], items=requests_per_endpoint)
+
+            def revalidate(path):
+                etag = get(path).headers['etag']
+                for _ in range(requests_per_endpoint):
+                    if client.get(path, headers={'If-None-Match': etag}).status_code != 304:
+                        raise RuntimeError(f"{path} did not answer a matching ETag with 304")
+            timer.measure("api: GET /dashboard (revalidate)", revalidate, "/dashboard", items=requests_per_endpoint)
+
+            # Every figure the dashboard links: thumbnails as a page view loads them, then the full-size images
+            with open(os.path.join(directory, "figures", "manifest.json"), 'r') as f:
+                figures = json.load(f)['figures']
+            thumbnails = [f"/images/{figure['thumbnail']}" for figure in figures]
+            full_size = [f"/images/{figure['file']}" for figure in figures]
+            page_bytes = lambda paths: sum(len(get(path).content) for path in paths)
+            timer.measure("api: GET thumbnails (origin fetch)", page_bytes, thumbnails, items=len(thumbnails))
+            timer.measure("api: GET thumbnails (disk cache)", page_bytes, thumbnails, items=len(thumbnails))
+            main.image_cache.ttl = 0
+            timer.measure("api: GET thumbnails (origin revalidate)", page_bytes, thumbnails, items=len(thumbnails))
+            main.image_cache.ttl = main.IMAGE_TTL
+            print(f"Figure bytes per page view: {page_bytes(thumbnails):,} as thumbnails, {page_bytes(full_size):,} full size")
+    finally:
+        os.chdir(cwd)
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = {result['stage']: result for result in json.load(f)['stages']}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['stage'])
+        if not previous or 'error' in result or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        if ratio > REGRESSION_FACTOR:
+            regressions.append((result['stage'], previous['seconds'], result['seconds'], ratio))
+    for stage, before, after, ratio in regressions:
+        print(f"REGRESSION {stage}: {before:.3f}s -> {after:.3f}s ({ratio:.2f}x)")
+    if not regressions:
+        print(f"No stage slower than {REGRESSION_FACTOR}x the baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the holder pipeline against synthetic data")
+    parser.add_argument("--accounts", default=",".join(str(count) for count in DEFAULT_ACCOUNTS),
+                        help="comma separated account count per synthetic mint")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows allocation-heavy stages)")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--serve", action="store_true", help="only run the mock API server until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of holder pages the mock API fails")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--output", help="results file (default benchmark_results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    account_counts = [int(count) for count in args.accounts.split(',')]
+    start = time.perf_counter()
+    tokens = generate_tokens(account_counts, args.seed)
+    print(f"Generated {sum(account_counts):,} accounts over {len(tokens)} mints in {time.perf_counter() - start:.1f}s")
+
+    if args.serve:
+        with MockApiServer(tokens, port=args.port, fail_rate=args.fail_rate) as server:
+            print(f"Serving mock SolanaFM/Sanctum API at {server.url} (Helius RPC at {server.url}/rpc) for mints: {', '.join(tokens)}")
+            try:
+                server.wait()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output = os.path.abspath(output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    timer = StageTimer(trace_memory=not args.no_memory)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="optimisoor-bench-") as workdir:
+        # The mock server doubles as the figure origin, serving what the pipeline renders
+        server = MockApiServer(tokens, port=args.port, fail_rate=args.fail_rate, figures_dir=os.path.join(workdir, "figures"))
+        with server:
+            # The pipeline reads and writes relative to the working directory
+            os.chdir(workdir)
+            try:
+                run_pipeline(timer, tokens, server)
+                if not args.skip_api:
+                    run_api(timer, tokens, server, workdir)
+            finally:
+                os.chdir(cwd)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'accounts': account_counts,
+        'trace_memory': not args.no_memory,
+        'mock_requests': server.request_counts,
+        'stages': timer.results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if baseline:
+        compare(timer.results, baseline)
+    # A stage that raised is a failure, not a timing, so the run exits non-zero for CI to catch
+    failed = [result['stage'] for result in timer.results if 'error' in result]
+    if failed:
+        print(f"{len(failed)} stages failed: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
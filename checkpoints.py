@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import time
+
+CHECKPOINT_DIR = ".checkpoints"
+# Holder pages shift as balances change, so an unfinished checkpoint older than this is discarded
+# rather than resumed
+CHECKPOINT_MAX_AGE = 3 * 3600
+# A finished one only lets a retried cycle skip its mint. It is cleared once every mint of the cycle
+# completes; while some mint keeps failing, the others are refetched at the holders stage's cadence.
+COMPLETE_MAX_AGE = 6 * 3600
+
+class PageCheckpoint:
+    # On-disk progress of one mint's paginated holder fetch: state.json records the page layout
+    # (plus whatever the source needs to resume, such as a cursor), and every completed page is
+    # saved as its own file, so a restarted fetch requests only the pages that are missing. Once
+    # every page is in, the pages are dropped and the state is marked complete, which lets a
+    # retried cycle skip the mint altogether.
+    def __init__(self, mint, root=CHECKPOINT_DIR, max_age=CHECKPOINT_MAX_AGE):
+        self.mint = mint
+        self.path = os.path.join(root, mint)
+        self.max_age = max_age
+        self.state = self.load_state()
+
+    @property
+    def state_path(self):
+        return os.path.join(self.path, "state.json")
+
+    def page_path(self, page):
+        return os.path.join(self.path, f"page_{page:06d}.json")
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, 'r') as f:
+            state = json.load(f)
+        if state.get('complete'):
+            expired = time.time() - state['completed'] > COMPLETE_MAX_AGE
+        else:
+            expired = time.time() - state['started'] > self.max_age
+        if expired:
+            print(f"{self.mint}: discarding checkpoint from {time.ctime(state['started'])}")
+            self.clear()
+            return None
+        return state
+
+    def save_state(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(self.state, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    @property
+    def complete(self):
+        return bool(self.state and self.state.get('complete'))
+
+    def start(self, total_items, page_size, total_pages):
+        # A layout change means the pages already saved no longer line up, so start over
+        # Cursor-paged sources know neither total up front and pass None for both
+        layout = {'total_items': total_items, 'page_size': page_size, 'total_pages': total_pages}
+        if self.state and all(self.state.get(key) == value for key, value in layout.items()):
+            return
+        self.clear()
+        self.state = {'mint': self.mint, 'started': time.time(), 'complete': False, **layout}
+        self.save_state()
+
+    def completed_pages(self):
+        if not os.path.isdir(self.path):
+            return set()
+        return {int(name[5:-5]) for name in os.listdir(self.path) if name.startswith("page_") and name.endswith(".json")}
+
+    def missing_pages(self):
+        return sorted(set(range(1, self.state['total_pages'] + 1)) - self.completed_pages())
+
+    def write_page(self, page, rows):
+        path = self.page_path(page)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(rows, f, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+
+    def read_page(self, page):
+        with open(self.page_path(page), 'r') as f:
+            return json.load(f)
+
+    def read_rows(self):
+        rows = []
+        for page in sorted(self.completed_pages()):
+            rows.extend(self.read_page(page))
+        return rows
+
+    def mark_complete(self):
+        for page in self.completed_pages():
+            os.remove(self.page_path(page))
+        self.state['complete'] = True
+        self.state['completed'] = time.time()
+        self.save_state()
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.state = None
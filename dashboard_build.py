@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+import metrics
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "optimisoor", "templates")
+TEMPLATE_NAME = "dashboard.html"
+# Where the built pages land; the app serves the latest build from here
+DASHBOARD_DIR = os.environ.get("DASHBOARD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard"))
+# Points at the current build's files; replaced last, so a reader never sees a half-written build
+BUILD_FILE = "build.json"
+
+# Figures in the carousel, in order; each token's row shows the figures mapped to the template's two cards
+OVERALL_PLOTS = ['total_tokens', 'total_tokens_cumulative', 'token_diversity', 'unique_owners']
+TOKEN_SLOTS = {'pet_log_bins': 'pet', 'log_bins': 'log'}
+
+VARIANT_SUFFIXES = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+
+def asset_url(base_url, filename, digest):
+    # The digest in the query changes whenever the figure does, so a cached copy is never stale
+    return f"{base_url}{filename}?v={digest[:12]}"
+
+def figure_urls(base_url, figure):
+    # Cards and the carousel load the thumbnail; the modal fetches the full figure when opened
+    return {'thumb': asset_url(base_url, figure['thumbnail'], figure['thumbnail_sha256']),
+            'full': asset_url(base_url, figure['file'], figure['sha256'])}
+
+def dashboard_context(manifest, base_url):
+    overall = {}
+    lst_graphs = {}
+    for figure in manifest['figures']:
+        if figure['token'] is None:
+            overall[figure['plot']] = figure
+        elif figure['plot'] in TOKEN_SLOTS:
+            lst_graphs.setdefault(figure['name'], {})[TOKEN_SLOTS[figure['plot']]] = figure_urls(base_url, figure)
+    overall_graphs = {}
+    for plot in OVERALL_PLOTS:
+        if plot in overall:
+            label = os.path.splitext(overall[plot]['file'])[0].replace('_', ' ')
+            overall_graphs[label] = figure_urls(base_url, overall[plot])
+    # Tokens without holders in range get no histogram, so their row is left out
+    lst_graphs = {name: urls for name, urls in lst_graphs.items() if len(urls) == len(TOKEN_SLOTS)}
+    return {'overall_graphs': overall_graphs, 'lst_graphs': lst_graphs}
+
+def render_html(context):
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape())
+    return environment.get_template(TEMPLATE_NAME).render(**context)
+
+def encode_variants(html):
+    body = html.encode('utf-8')
+    # mtime=0 keeps the gzip bytes identical across builds of the same page
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if BROTLI_AVAILABLE:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+def read_build(directory=DASHBOARD_DIR):
+    path = os.path.join(directory, BUILD_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_file(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def prune_builds(directory, builds):
+    # The previous build's files are kept for an app that read its build.json just before the swap
+    keep = {filename for build in builds if build for filename in build['files'].values()}
+    for filename in os.listdir(directory):
+        if filename.startswith("dashboard.") and filename not in keep:
+            os.remove(os.path.join(directory, filename))
+
+def build_dashboard(manifest_path, base_url, directory=DASHBOARD_DIR):
+    start = time.perf_counter()
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    html = render_html(dashboard_context(manifest, base_url))
+    digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+    previous = read_build(directory)
+    if previous and previous['sha256'] == digest:
+        # Rewriting an identical page would only move Last-Modified and cost every visitor a full fetch
+        print(f"Dashboard unchanged ({digest[:12]})")
+        return previous
+
+    os.makedirs(directory, exist_ok=True)
+    name = f"dashboard.{digest[:12]}.html"
+    files = {}
+    for encoding, body in encode_variants(html).items():
+        files[encoding] = name + VARIANT_SUFFIXES[encoding]
+        write_file(os.path.join(directory, files[encoding]), body)
+    build = {'sha256': digest, 'built_at': int(time.time()), 'files': files}
+    write_file(os.path.join(directory, BUILD_FILE), json.dumps(build, indent=2, sort_keys=True).encode())
+    prune_builds(directory, [build, previous])
+
+    metrics.REGISTRY.observe("dashboard_build_seconds", time.perf_counter() - start)
+    print(f"Built dashboard {digest[:12]} with {len(manifest['figures'])} figures "
+          f"({', '.join(sorted(files))}) in {time.perf_counter() - start:.2f}s")
+    return build
+
+if __name__ == "__main__":
+    # python dashboard_build.py <figures manifest> <image base url, e.g. /images/> [output directory]
+    build_dashboard(*sys.argv[1:4])
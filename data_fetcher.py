@@ -1,113 +1,200 @@
-import requests
+import asyncio
 import json
 import time
 import pandas as pd
 import os
+import snapshot_store
+import holder_index
+import holder_sources
+import metrics
+import token_api
+from http_client import HostRateLimiter, create_client, MAX_CONCURRENT_MINTS, MAX_CONCURRENT_PAGES
 
-def fetch_token_metadata(mint):
-    url = f"https://api.sanctum.so/v1/metadata/{mint}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to fetch metadata for {mint}: {e}")
-        return None
-
-def fetch_token_accounts_from_solana_fm(mint):
-    url = f"https://api.solana.fm/v1/tokens/{mint}/holders"
-    headers = {"accept": "application/json"}
-    token_accounts = []
-    page = 1
-    total_items_collected = 0
-    total_items_available = float('inf')  # Initial assumption
-
-    while total_items_collected < total_items_available:
-        params = {
-            'page': page,
-            'pageSize': 1000  # Adjust the pageSize if needed
-        }
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-
-            data = response.json()
-            if 'tokenAccounts' in data and data['tokenAccounts']:
-                token_accounts.extend(data['tokenAccounts'])
-                total_items_collected += len(data['tokenAccounts'])
-            else:
-                break
+# Bytes read per chunk when streaming raw account JSON, and accounts normalized per batch
+READ_CHUNK_SIZE = 1 << 16
+# Characters that can follow a complete top-level array element
+VALUE_DELIMITERS = ' \t\r\n,]'
+PROCESS_CHUNK_ROWS = 10000
 
-            total_items_available = data.get('totalItemCount', 0)
-            print(f"Page {page}: Retrieved {len(data['tokenAccounts'])} accounts, Total collected: {total_items_collected}")
-            page += 1
-            time.sleep(1)
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch token accounts for {mint} on page {page}: {e}")
-            break
+TOKENS = [
+    'LAinEtNLgpmCP9Rvsf5Hn8W6EhNiKLZQti1xfWMLy6X',
+    'J1toso1uCk3RLmjorhTtrVwY9HJ7X8V9yYac6Y7kGCPn',
+    'fpSoL8EJ7UA5yJxFKWk1MFiWi35w8CbH36G5B9d7DsV',
+    'pathdXw4He1Xk3eX84pDdDZnGKEme3GivBamGCVPZ5a',
+    'iceSdwqztAQFuH6En49HWwMxwthKMnGzLFQcMN3Bqhj',
+    'jucy5XJ76pHVvtPZb5TKRcGQExkwit2P5s4vY8UzmpC',
+    '5oVNBeEEQvYi1cX3ir8Dx5n1P7pdxydbGF2X4TxVusJm',
+    'jupSoLaHXQiZZTSfEWMTRRgpnyFm8f6sZdosWBjx93v',
+    'he1iusmfkpAdwvxLNGV8Y1iSbj4rUy6yMhEA3fotn9A',
+    'BonK1YhkXEGLZzwtcvRTip3gAL9nCeQD7ppZBLXhtTs',
+    'GRJQtWwdJmp5LLpy8JWjPgn5FnLyqSJGNhn5ZnCTFUwM',
+    'Comp4ssDzXcLeu2MnLuGNNFC4cmLPMng8qWHPvzAMU1h',
+    'HUBsveNpjo5pWqNkH57QzxjQASdTVXcSK7bVKTSZtcSX',
+    'picobAEvs6w7QEknPce34wAE4gknZA9v5tTonnmHYdX',
+    'Dso1bDeDjCQxTrWHqUUi63oBvV7Mdm6WaobLbQ7gnPQ',
+    'LnTRntk2kTfWEY6cVB8K9649pgJbt6dJLS1Ns1GZCWg',
+    'phaseZSfPxTDBpiVb96H4XFSD8xHeHxZre5HerehBJG',
+    'pumpkinsEq8xENVZE6QgTS93EN4r9iKvNxNALS1ooyp',
+    'pWrSoLAhue6jUxUkbWgmEy5rD9VJzkFmvfTDV5KgNuu',
+    'CgnTSoL3DgY9SFHxcLj6CgCgKKoTBr6tp4CPAEWy25DE'
+]
 
-    if token_accounts:
-        with open(f"{mint}_accounts.json", 'w') as f:
-            json.dump(token_accounts, f, indent=2)
+async def fetch_token_accounts(client, limiter, mint, page_semaphore):
+    # Returns the columns written for the mint, or None when no source returned every holder
+    fetched = await holder_sources.fetch_holders(client, limiter, mint, page_semaphore)
+    if fetched is None:
+        return None
+    source, (owners, amounts, decimals) = fetched
+    metrics.REGISTRY.inc("accounts_fetched_total", len(owners))
+    if len(owners):
+        snapshot_store.write_columns(".", mint, owners, amounts, decimals)
     else:
-        print(f"No token accounts retrieved for {mint}")
+        print(f"No token accounts retrieved for {mint} from {source}")
+    return owners, amounts, decimals
+
+async def fetch_all_token_accounts(tokens, max_concurrent_mints=MAX_CONCURRENT_MINTS,
+                                  max_concurrent_pages=MAX_CONCURRENT_PAGES, rate_limits=None):
+    # Returns the mints whose fetch is incomplete
+    limiter = HostRateLimiter(rate_limits)
+    mint_semaphore = asyncio.Semaphore(max_concurrent_mints)
+    page_semaphore = asyncio.Semaphore(max_concurrent_pages)
+    incomplete = []
 
-    return token_accounts
+    async def process_mint(client, mint, metadata):
+        # A retried cycle skips mints that already completed within the checkpoint window
+        if holder_sources.recently_fetched(mint) and snapshot_store.has_columns(".", mint):
+            print(f"{mint}: fetched recently, skipping")
+            return
+        async with mint_semaphore:
+            if not metadata:
+                print(f"No metadata for {mint}; skipping")
+                return
+            print(f"Processing {metadata['name']} ({metadata['symbol']})")
+            if await fetch_token_accounts(client, limiter, mint, page_semaphore) is None:
+                incomplete.append(mint)
+                return
+            print(f"Completed {metadata['name']} ({metadata['symbol']})")
 
-def load_and_process_json_files(tokens):
-    data_dict = {mint: [] for mint in tokens}  # Dictionary to hold data for each token
+    async with create_client(max_concurrent_pages + max_concurrent_mints) as client:
+        metadata_results = await token_api.get_metadata(tokens, client, limiter)
+        await asyncio.gather(*(process_mint(client, mint, metadata_results[mint]) for mint in tokens))
+    return incomplete
 
-    for mint in tokens:
-        filename = f"{mint}_accounts.json"
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                accounts = json.load(f)
-                for account in accounts:
-                    info = account['info']
-                    amount_normalized = float(info['tokenAmount']['amount']) / (10 ** info['tokenAmount']['decimals'])
-                    # Add a conditional check to only append non-zero amounts
-                    if amount_normalized > 0.01:
-                        data_dict[mint].append({'owner': info['owner'], 'amount_normalized': amount_normalized})
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    # Yields the elements of a top-level JSON array while only holding one read chunk in memory
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # A value touching the end of the buffer may be truncated, so read more first. A bare
+                # number can also stop early at a '.' or 'e' split off by the read, so it only counts
+                # once a delimiter follows it.
+                complete = end < len(buffer) and (isinstance(item, (dict, list, str)) or buffer[end] in VALUE_DELIMITERS)
+                if complete or eof:
+                    yield item
+                    position = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        if eof:
+            if not started:
+                raise ValueError("Expected a JSON array")
+            raise ValueError("Unterminated JSON array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
 
-    # Save the dictionary to a JSON file if it contains non-zero entries
-    with open("token_data.json", 'w') as json_file:
-        json.dump(data_dict, json_file, indent=2)
-    print("Data has been written to token_data.json")
+def iter_normalized_chunks(mint, min_amount=0.01, chunk_rows=PROCESS_CHUNK_ROWS):
+    filename = f"{mint}_accounts.json"
+    if snapshot_store.has_columns(".", mint):
+        decimals = snapshot_store.read_meta(".", mint)['decimals'] or 0
+        owner_table = snapshot_store.read_column(".", mint, "owner_table")
+        owner_index = snapshot_store.read_column(".", mint, "owner")
+        raw_amounts = snapshot_store.read_column(".", mint, "amount")
+        for start in range(0, len(raw_amounts), chunk_rows):
+            amounts = raw_amounts[start:start + chunk_rows] / float(10 ** decimals)
+            keep = amounts > min_amount
+            # A block that is all dust yields nothing rather than an empty chunk
+            if not keep.any():
+                continue
+            yield owner_table[owner_index[start:start + chunk_rows][keep]].tolist(), amounts[keep].tolist()
+    elif os.path.exists(filename):
+        with open(filename, 'r') as f:
+            owners, amounts = [], []
+            for account in iter_json_array(f):
+                info = account['info']
+                amount_normalized = float(info['tokenAmount']['amount']) / (10 ** info['tokenAmount']['decimals'])
+                # Add a conditional check to only append non-zero amounts
+                if amount_normalized > min_amount:
+                    owners.append(info['owner'])
+                    amounts.append(amount_normalized)
+                if len(owners) >= chunk_rows:
+                    yield owners, amounts
+                    owners, amounts = [], []
+            if owners:
+                yield owners, amounts
 
-def main():
-    tokens = [
-        'LAinEtNLgpmCP9Rvsf5Hn8W6EhNiKLZQti1xfWMLy6X',
-        'J1toso1uCk3RLmjorhTtrVwY9HJ7X8V9yYac6Y7kGCPn',
-        'fpSoL8EJ7UA5yJxFKWk1MFiWi35w8CbH36G5B9d7DsV',
-        'pathdXw4He1Xk3eX84pDdDZnGKEme3GivBamGCVPZ5a',
-        'iceSdwqztAQFuH6En49HWwMxwthKMnGzLFQcMN3Bqhj',
-        'jucy5XJ76pHVvtPZb5TKRcGQExkwit2P5s4vY8UzmpC',
-        '5oVNBeEEQvYi1cX3ir8Dx5n1P7pdxydbGF2X4TxVusJm',
-        'jupSoLaHXQiZZTSfEWMTRRgpnyFm8f6sZdosWBjx93v',
-        'he1iusmfkpAdwvxLNGV8Y1iSbj4rUy6yMhEA3fotn9A',        
-        'BonK1YhkXEGLZzwtcvRTip3gAL9nCeQD7ppZBLXhtTs',
-        'GRJQtWwdJmp5LLpy8JWjPgn5FnLyqSJGNhn5ZnCTFUwM',
-        'Comp4ssDzXcLeu2MnLuGNNFC4cmLPMng8qWHPvzAMU1h',
-        'HUBsveNpjo5pWqNkH57QzxjQASdTVXcSK7bVKTSZtcSX',        
-        'picobAEvs6w7QEknPce34wAE4gknZA9v5tTonnmHYdX',
-        'Dso1bDeDjCQxTrWHqUUi63oBvV7Mdm6WaobLbQ7gnPQ',
-        'LnTRntk2kTfWEY6cVB8K9649pgJbt6dJLS1Ns1GZCWg',
-        'phaseZSfPxTDBpiVb96H4XFSD8xHeHxZre5HerehBJG',
-        'pumpkinsEq8xENVZE6QgTS93EN4r9iKvNxNALS1ooyp',
-        'pWrSoLAhue6jUxUkbWgmEy5rD9VJzkFmvfTDV5KgNuu',
-        'CgnTSoL3DgY9SFHxcLj6CgCgKKoTBr6tp4CPAEWy25DE'        
-    ]
+def load_and_process_json_files(tokens, output_path="token_data.json"):
+    # token_data.json is written one mint and one chunk at a time, so nothing holds the whole dataset
+    with metrics.stage("process") as run, open(output_path, 'w') as json_file:
+        json_file.write('{')
+        for index, mint in enumerate(tokens):
+            json_file.write(('' if index == 0 else ',') + json.dumps(mint) + ':[')
+            rows = 0
+            for owners, amounts in iter_normalized_chunks(mint):
+                records = ','.join(json.dumps({'owner': owner, 'amount_normalized': amount}, separators=(',', ':'))
+                                   for owner, amount in zip(owners, amounts))
+                if not records:
+                    continue
+                json_file.write((',' if rows else '') + records)
+                rows += len(owners)
+            json_file.write(']')
+            run.rows += rows
+            print(f"{mint}: wrote {rows} accounts")
+        json_file.write('}')
+    print(f"Data has been written to {output_path}")
 
-    for mint in tokens:
-        metadata = fetch_token_metadata(mint)
-        if metadata:
-            print(f"Processing {metadata['name']} ({metadata['symbol']})")
-            fetch_token_accounts_from_solana_fm(mint)
-            print(f"Completed {metadata['name']} ({metadata['symbol']})")
-        time.sleep(5)  # Sleep to manage API call frequency
+def run_fetcher(tokens=TOKENS):
+    # Returns the mints whose fetch is incomplete; they are left out of token_data.json and the indexes
+    # rather than being written from a previous cycle's columns
+    start = time.perf_counter()
+    with metrics.stage("fetch"):
+        incomplete = asyncio.run(fetch_all_token_accounts(tokens))
+    print(f"Fetched holders for {len(tokens)} tokens in {time.perf_counter() - start:.1f}s")
+    completed = [mint for mint in tokens if mint not in incomplete]
 
     # After collecting all data, process it into a single JSON
-    load_and_process_json_files(tokens)
+    load_and_process_json_files(completed)
+    with metrics.stage("index"):
+        holder_index.build_indexes(".", completed)
+    if incomplete:
+        print(f"Holder fetch incomplete for {len(incomplete)} mints: {', '.join(incomplete)}")
+    else:
+        # The next cycle starts from fresh pages instead of skipping mints finished in this one
+        holder_sources.clear_completed(tokens)
+    return incomplete
+
+def main():
+    incomplete = run_fetcher(TOKENS)
+    if incomplete:
+        raise SystemExit(f"Holder fetch incomplete for {len(incomplete)} mints")
 
 if __name__ == "__main__":
     main()
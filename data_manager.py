@@ -1,8 +1,33 @@
 import os
-import time
+import json
+import hashlib
 from datetime import datetime
-import subprocess
 import shutil
+import holder_snapshots
+import holder_index
+import uploader
+import snapshot_store
+import timeseries
+import data_fetcher
+import data_plotter
+import dashboard_build
+from data_fetcher import TOKENS
+import metrics
+import token_api
+from scheduler import Scheduler, Stage
+
+# Store each day's holders as a base plus deltas instead of keeping full raw account dumps
+INCREMENTAL_SNAPSHOTS = True
+
+# Stage cadences in seconds; plots and uploads run whenever their inputs change
+PRICE_INTERVAL = 5 * 60
+HOLDER_INTERVAL = 6 * 3600
+SCHEDULER_STATE_PATH = "data/scheduler_state.json"
+PRICES_PATH = "token_prices.json"
+# Where push_to_server publishes figures
+FIGURES_BASE_URL = "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/"
+# The dashboard links figures through the app's /images proxy, which caches them from the drive
+DASHBOARD_IMAGE_URL = os.environ.get("DASHBOARD_IMAGE_URL", "/images/")
 
 def create_dated_directory():
     date = datetime.now().strftime("%Y%m%d")
@@ -11,94 +36,107 @@ def create_dated_directory():
     print(f"Created directory: {directory}")
     return directory
 
-def get_last_fetch_time(directory):
-    json_files = [file for file in os.listdir(directory) if file.endswith(".json")]
-    if json_files:
-        last_fetch_time = max(os.path.getmtime(f"{directory}/{file}") for file in json_files)
-        return datetime.fromtimestamp(last_fetch_time)
-    return None
-
-def should_fetch_data(directory):
-    last_fetch_time = get_last_fetch_time(directory)
-    if last_fetch_time:
-        time_since_last_fetch = datetime.now() - last_fetch_time
-        if time_since_last_fetch.total_seconds() > 6 * 3600:
-            print("More than 6 hours have passed since the last fetch. Fetching new data.")
-            return True
-        else:
-            print(f"Last fetch was less than 6 hours ago. Skipping data fetch.")
-            return False
-    print("No previous fetch exists for the current day. Fetching new data.")
-    return True
-
-def run_data_fetcher():
-    print("Running data fetcher script...")
-    subprocess.run(["python3", "data_fetcher.py"])
-    print("Data fetcher script completed.")
-
-def run_data_plotter():
-    print("Running data plotter script...")
-    subprocess.run(["python3", "data_plotter.py"])
-    print("Data plotter script completed.")
-
 def push_to_server(directory):
-    base_url = "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/"
+    base_url = FIGURES_BASE_URL
     api_url = "https://radial-tame-snow.solana-mainnet.quiknode.pro/f02bf8d532bcad89e4758a5e5540fb988debdcd2/"
     keypair_path = "/Users/hogyzen12/.config/solana/dshYBbhPkXeYjuHPq1XZGivpXdS4ibXp2jfaACs5ZrH.json"
-    
-    for filename in os.listdir(directory):
-        if filename.endswith(".webp"):
-            file_path = os.path.join(directory, filename)
-            file_url = f"{base_url}{filename}"
-            print(file_path)
-            print(file_url)
-            command = [
-                "shdw-drive", "edit-file",
-                "-r", api_url,
-                "-kp", keypair_path,
-                "-f", file_path,
-                "-u", file_url
-            ]
-            subprocess.run(command)
-    time.sleep(1)
-
-def move_data_to_directory(directory):
-    print(f"Moving JSON files to directory: {directory}")
+
+    file_uploader = uploader.uploader_from_env(uploader.shdw_drive_uploader(api_url, keypair_path))
+    return uploader.upload_directory(directory, base_url, file_uploader)
+
+def record_holder_snapshots(directory, tokens=TOKENS):
+    print("Recording holder snapshots...")
+    churn = holder_snapshots.record_snapshots(directory, tokens)
+    print(f"Recorded holder snapshots for {len(churn)} tokens.")
+
+def move_data_to_directory(directory, keep_raw_accounts=not INCREMENTAL_SNAPSHOTS):
+    # Copies rather than moves, so the plot stage can keep reading the latest data between fetches
+    print(f"Archiving JSON files to directory: {directory}")
     json_files = [file for file in os.listdir() if file.endswith(".json")]
     for file in json_files:
+        # Raw account dumps are already captured by the holder snapshot for the day
+        if not keep_raw_accounts and file.endswith("_accounts.json"):
+            os.remove(file)
+            continue
+        # So is token_data.json, which would otherwise store every holder again each day
+        if not keep_raw_accounts and file == "token_data.json":
+            continue
         new_file_name = file.replace(" ", "_")
-        shutil.move(file, os.path.join(directory, new_file_name))
-    print("JSON files moved to the directory with spaces replaced by underscores.")
+        shutil.copy2(file, os.path.join(directory, new_file_name))
+    if keep_raw_accounts:
+        # A holder index is two float64 arrays per holder, so it is only archived next to full columns;
+        # incremental days rebuild theirs from the snapshot chain when the time series needs one
+        for file in os.listdir():
+            if file.endswith(holder_index.INDEX_SUFFIX):
+                shutil.copy2(file, os.path.join(directory, file))
+        for mint in snapshot_store.available_mints("."):
+            shutil.rmtree(snapshot_store.columns_path(directory, mint), ignore_errors=True)
+            shutil.copytree(snapshot_store.columns_path(".", mint), snapshot_store.columns_path(directory, mint))
+    print("JSON files archived to the directory with spaces replaced by underscores.")
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def fetch_prices_stage():
+    prices = token_api.fetch_prices(TOKENS)
+    with open(PRICES_PATH, 'w') as f:
+        json.dump(prices, f, indent=2)
+    # Plots show prices to four decimals in SOL, so only a change at that precision counts as new data
+    shown = {mint: f"{amount / 1_000_000_000:.4f}" for mint, amount in sorted(prices.items())}
+    return hashlib.sha256(json.dumps(shown).encode()).hexdigest()
+
+def fetch_holders_stage():
+    directory = create_dated_directory()
+    incomplete = data_fetcher.run_fetcher(TOKENS)
+    completed = [mint for mint in TOKENS if mint not in incomplete]
+    if INCREMENTAL_SNAPSHOTS:
+        record_holder_snapshots(directory, completed)
+    move_data_to_directory(directory)
+    timeseries.record_directory(directory, completed)
+    if incomplete:
+        # The completed mints are archived first; the retry only refetches the rest, from their checkpoints
+        raise RuntimeError(f"Holder fetch incomplete for {len(incomplete)} mints: {', '.join(incomplete)}")
+    return file_digest("token_data.json")
+
+def plot_stage():
+    prices = None
+    if os.path.exists(PRICES_PATH):
+        with open(PRICES_PATH, 'r') as f:
+            prices = json.load(f)
+    data_plotter.run_plotter("token_data.json", prices_dict=prices)
+    # The push stage re-runs whenever any figure's bytes differ from the previous plot run
+    cache = data_plotter.read_json_file(os.path.join("figures", data_plotter.RENDER_CACHE_FILE), {})
+    figure_digests = {entry['file']: entry['digest'] for entry in cache.values()}
+    return hashlib.sha256(json.dumps(figure_digests, sort_keys=True).encode()).hexdigest()
+
+def push_stage():
+    uploaded, failed = push_to_server("figures")
+    if failed:
+        # Failing the stage schedules a retry; the manifest keeps what already landed
+        raise RuntimeError(f"{len(failed)} figures failed to upload")
+    # Built once the figures have landed, so the page never links a version the drive does not have yet
+    dashboard_build.build_dashboard(os.path.join("figures", data_plotter.MANIFEST_FILE), DASHBOARD_IMAGE_URL)
+    return len(uploaded)
+
+def write_cycle_report(stages):
+    # Metrics since the last report, appended to the day's run_report.json
+    directory = f"data/{datetime.now().strftime('%Y%m%d')}"
+    path = metrics.write_run_report(directory, sorted(stages))
+    print(f"Run report written to {path}")
+
+def build_scheduler():
+    stages = [
+        Stage("prices", fetch_prices_stage, interval=PRICE_INTERVAL, retry_delay=60),
+        Stage("holders", fetch_holders_stage, interval=HOLDER_INTERVAL),
+        Stage("plots", plot_stage, depends_on=("prices", "holders")),
+        Stage("push", push_stage, depends_on=("plots",)),
+    ]
+    return Scheduler(stages, SCHEDULER_STATE_PATH, after_run=write_cycle_report)
 
 def main():
-    while True:
-        print("\n--- Starting data fetch cycle ---")
-        
-        # Create a dated directory for each data fetch
-        directory = create_dated_directory()
-
-        # Check if data should be fetched based on the last fetch time
-        if should_fetch_data(directory):
-            # Run the data fetcher script
-            run_data_fetcher()
-            print("Data fetch cycle completed.")
-
-        # Run the data plotter script
-        run_data_plotter()
-
-        # Move the data to the dated directory
-        move_data_to_directory(directory)
-        print("Data plotting completed.")
-
-        # Push the data and images to the server
-        push_to_server("figures")
-        print("Pushing images.")
-        
-        
-        
-        # Sleep for a day (86400 seconds) before the next fetch
-        print("Waiting for the next data fetch cycle...")
-        time.sleep(86400)
+    # Runs every stage in-process; state in data/scheduler_state.json lets a restart pick up where it left off
+    build_scheduler().run_forever()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,29 @@
 import requests
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from PIL import Image
 import os
 import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import snapshot_store
+from holder_index import AmountIndex
+import metrics
+import plot_specs
+import token_api
+
+# Cap on figure rendering processes; unset or 0 uses one per core, 1 renders in-process
+MAX_RENDER_WORKERS = int(os.environ.get("PLOT_WORKERS", "0")) or None
+
+# Kept inside the figures directory: input hashes and output digests of rendered figures
+RENDER_CACHE_FILE = ".render_cache.json"
+# Written next to the figures after every run: what was produced, for whom, and each file's digest
+MANIFEST_FILE = "manifest.json"
+# Width of the downscaled copy written next to every figure for the dashboard's cards and carousel
+THUMBNAIL_WIDTH = 480
 
 def fetch_token_data(url):
     response = requests.get(url)
@@ -13,253 +34,335 @@ def load_token_data(filepath):
     with open(filepath, 'r') as file:
         return json.load(file)
 
-def fetch_token_metadata(mint):
-    url = f"https://api.sanctum.so/v1/metadata/{mint}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        response.raise_for_status()
+def load_token_columns(directory="."):
+    # Memory-maps the columnar snapshots written by data_fetcher instead of parsing token_data.json
+    return {mint: snapshot_store.load_token_columns(directory, mint) for mint in snapshot_store.available_mints(directory)}
 
-def fetch_token_prices(mints):
-    mints_query = '&'.join(f'input={mint}' for mint in mints)
-    url = f"https://api.sanctum.so/v1/price?{mints_query}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        price_data = response.json().get('prices', [])
-        return {item['mint']: float(item['amount']) for item in price_data if 'mint' in item and 'amount' in item}
-    else:
-        response.raise_for_status()
+def token_columns(token_data):
+    # Accepts either the token_data.json list of accounts or a dict of columns
+    if isinstance(token_data, dict):
+        return token_data['owner'], np.asarray(token_data['amount_normalized'], dtype=float)
+    owners = [account['owner'] for account in token_data]
+    amounts = np.array([account['amount_normalized'] for account in token_data], dtype=float)
+    return owners, amounts
 
-def save_plot(directory, filename, format='webp'):
+def save_figure(fig, directory, filename, format='webp'):
     if not os.path.exists(directory):
-        os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
     # Ensure the filename is URL-friendly
     filename = filename.replace(" ", "_")
     filepath = os.path.join(directory, filename)
-    plt.savefig(filepath, format=format)
-    plt.close()
-
-def plot_logarithmic_bins(data, token_id, metadata, price, directory="figures"):
-    token_data = data.get(token_id, [])
-    if not token_data:
+    fig.savefig(filepath, format=format)
+    return filepath
+
+def thumbnail_path(filepath):
+    root, ext = os.path.splitext(filepath)
+    return f"{root}_thumb{ext}"
+
+def save_thumbnail(filepath, width=THUMBNAIL_WIDTH):
+    # The dashboard shows this copy and only fetches the full figure when one is opened
+    with Image.open(filepath) as image:
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        path = thumbnail_path(filepath)
+        image.save(path, format='webp', quality=80, method=6)
+    return path
+
+def plot_histogram(plot, histogram, fields=None, statistics=None, directory="figures"):
+    # Any chart registered in plot_specs.PLOT_SPECS, from its precomputed histogram
+    spec = plot_specs.PLOT_SPECS[plot]
+    if histogram['counts'].sum() == 0 and spec['data'] == 'token':
         return None
-
-    amounts = np.array([account['amount_normalized'] for account in token_data if account['amount_normalized'] > 0])
-    if amounts.size == 0:
-        return None
-
-    bins = [0.1, 1, 10, 100, 1000, np.inf]
-    bin_labels = ['0.1-1', '1-10', '10-100', '100-1000', '1000+']
-    counts, _ = np.histogram(amounts, bins=bins)
-    percentages = (counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(counts)
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(bin_labels, percentages, color='green', alpha=0.7)
-    plt.title(f"Distribution of {metadata['name']} ({metadata['symbol']}) - Current Price: {price:.4f} SOL")
-    plt.xlabel("Token Holdings Range")
-    plt.ylabel("Percentage of Holders")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-
-    filename = f"{metadata['name']}_log_bins.webp".replace(" ", "_")
-    save_plot(directory, filename)
-
-def plot_pet_logarithmic_bins(data, token_id, metadata, price, directory="figures"):
-    token_data = data.get(token_id, [])
-    if not token_data:
-        return None
-
-    amounts = np.array([account['amount_normalized'] for account in token_data if account['amount_normalized'] > 0])
-    if amounts.size == 0:
-        return None
-
-    bins = [0.1, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 2, 4, 6, 8, 10, np.inf]
-    bin_labels = ['0.1-0.3','0.3-0.5', '0.5-0.7', '0.7-0.9', '0.9-1.0','1.0-1.1', '1.1-2', '2-4', '4-6', '6-8', '8-10', '10+']
-    counts, _ = np.histogram(amounts, bins=bins)
-    percentages = (counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(counts)
-
-    # Compute statistics
-    statistics = compute_statistics(amounts)
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(bin_labels, percentages, color='green', alpha=0.7)
-    plt.title(f"Distribution of {metadata['name']} ({metadata['symbol']}) - Current Price: {price:.4f} SOL")
-    plt.xlabel("Token Holdings Range")
-    plt.ylabel("Percentage of Holders")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-
-    # Annotating with statistics
-    stats_text = "\n".join([f"{key}: {val:.2f}" for key, val in statistics.items()])
-    plt.annotate(stats_text, xy=(0.75, 0.95), xycoords='axes fraction', verticalalignment='top', bbox=dict(boxstyle="round,pad=0.5", fc="yellow", alpha=0.5))
-
-    
-    filename = f"{metadata['name']}_pet_log_bins.webp".replace(" ", "_")
-    save_plot(directory, filename)
-
-def compute_statistics(amounts):
-    statistics = {
-        'mean': np.mean(amounts),
-        'median': np.median(amounts),
-        'sum': np.sum(amounts),
-        'count': len(amounts),
-        'std_dev': np.std(amounts),
-        'min': np.min(amounts),
-        'max': np.max(amounts)
-    }
-    return statistics
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    plot_specs.draw_histogram(ax, spec, histogram, fields, statistics)
+    filename = spec['output'].format(**(fields or {})).replace(" ", "_")
+    return save_figure(fig, directory, filename)
+
+class OwnerMatrix:
+    # Sparse owner x token holdings in coordinate form, with the per-owner and per-token
+    # reductions every cross-token plot needs computed once up front
+    def __init__(self, owners, tokens, owner_index, token_index, amounts):
+        self.owners = owners
+        self.tokens = tokens
+        self.owner_index = owner_index
+        self.token_index = token_index
+        self.amounts = amounts
+        self.totals = np.bincount(owner_index, weights=amounts, minlength=len(owners))
+        self.diversity = np.bincount(owner_index, minlength=len(owners))
+        self.holders_per_token = np.bincount(token_index, minlength=len(tokens))
+
+    def token_holdings(self, token_id):
+        mask = self.token_index == self.tokens.index(token_id)
+        return self.owners[self.owner_index[mask]], self.amounts[mask]
 
 def aggregate_owner_data(data):
-    owner_details = {}
-
-    for token_id, accounts in data.items():
-        for account in accounts:
-            owner = account['owner']
-            amount = account['amount_normalized']
-
-            if owner not in owner_details:
-                owner_details[owner] = {}
-            
-            # Adding each token with its amount to the owner's record
-            owner_details[owner][token_id] = amount
-
-    return owner_details
-
-
-def plot_total_tokens_per_owner(owner_details, directory="figures"):
-    # Calculate the total number of tokens owned by each owner
-    total_tokens = {owner: sum(tokens.values()) for owner, tokens in owner_details.items()}
-    values = list(total_tokens.values())
-
-    # Define bins and labels for the histogram
-    bins = [0.1, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 2, 4, 6, 8, 10, np.inf]
-    bin_labels = ['0.1-0.3', '0.3-0.5', '0.5-0.7', '0.7-0.9', '0.9-1.0', '1.0-1.1', '1.1-2', '2-4', '4-6', '6-8', '8-10', '10+']
-
-    # Histogram and calculate percentages
-    counts, _ = np.histogram(values, bins=bins)
-    percentages = (counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(counts)
-
-    # Plotting
-    plt.figure(figsize=(10, 6))
-    plt.bar(bin_labels, percentages, color='green', alpha=0.7)
-    plt.title("Distribution of Total Tokens Owned per Owner")
-    plt.xlabel("Total Tokens Owned")
-    plt.ylabel("Percentage of Owners (%)")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-
-    # Saving the plot
-    filename = "total_tokens_per_owner_distribution.webp".replace(" ", "_")
-    save_plot(directory, filename)
-
-def plot_token_diversity_per_owner(owner_details, directory="figures"):
-    diversity = {owner: len(tokens) for owner, tokens in owner_details.items()}
-    counts = list(diversity.values())
-
-    plt.figure(figsize=(10, 6))
-    plt.hist(counts, bins=range(1, max(counts) + 2), alpha=0.7, edgecolor='black', log=True)
-    plt.title("Distribution of Token Diversity per Owner")
-    plt.xlabel("Number of Different Tokens Owned")
-    plt.ylabel("Number of Owners")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-
-    filename = "token_diversity_per_owner.webp".replace(" ", "_")
-    save_plot(directory, filename)
-
-def plot_total_tokens_per_owner_cumulative(owner_details, directory="figures"):
-    # Calculate the total number of tokens owned by each owner
-    total_tokens = {owner: sum(tokens.values()) for owner, tokens in owner_details.items()}
-    values = list(total_tokens.values())
-
-    # Define bins and labels for the histogram
-    bins = [0.1, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 2, 4, 6, 8, 10, np.inf]
-    bin_labels = ['0.1-0.3', '0.3-0.5', '0.5-0.7', '0.7-0.9', '0.9-1.0', '1.0-1.1', '1.1-2', '2-4', '4-6', '6-8', '8-10', '10+']
-
-    # Histogram and calculate percentages for cumulative distribution
-    counts, bin_edges = np.histogram(values, bins=bins)
-    cumulative_counts = np.cumsum(counts)
-    percentages = (cumulative_counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(cumulative_counts)
-
-    # Plotting
-    plt.figure(figsize=(10, 6))
-    previous_cumulative = [0] + list(percentages[:-1])  # Start with 0 for the first bar's base
-
-    # Plot the base of each bar (previous cumulative percentages)
-    base_bars = plt.bar(bin_labels, previous_cumulative, color='blue', alpha=0.7)
-
-    # Calculate delta percentages for each bin
-    delta_percentages = [percentages[i] - previous_cumulative[i] for i in range(len(percentages))]
-    
-    # Plot the delta percentages on top of the previous bars
-    delta_bars = plt.bar(bin_labels, delta_percentages, bottom=previous_cumulative, color='green', alpha=0.7)
-
-    # Annotating each bar with the delta
-    for bar, delta, total in zip(delta_bars, counts, cumulative_counts):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + bar.get_y(),
-                 f'+{int(delta)} ({(delta / counts.sum() * 100):.2f}%)',
-                 ha='center', va='bottom', color='black', fontsize=8)
-
-    plt.title("Cumulative Distribution of Total Tokens Owned per Owner")
-    plt.xlabel("Total Tokens Owned")
-    plt.ylabel("Cumulative Percentage of Owners (%)")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-
-    # Save the plot
-    filename = "cumulative_total_tokens_per_owner_distribution.webp".replace(" ", "_")
-    save_plot(directory, filename)
-
-def plot_unique_owners_per_token(data, metadata_results, directory="figures"):
-    # Aggregate data to count unique owners per token
-    token_owners = {}
-    token_names = {}
-    for token_id, accounts in data.items():
-        unique_owners = set(account['owner'] for account in accounts)
-        token_owners[token_id] = len(unique_owners)
-        # Assuming metadata_results is a dictionary where keys are token IDs and values contain token names
-        token_names[token_id] = metadata_results[token_id]['name'] if token_id in metadata_results and 'name' in metadata_results[token_id] else token_id
-
-    # Prepare data for plotting
-    tokens = [token_names[tid] for tid in token_owners]  # Using token names instead of IDs
-    owner_counts = list(token_owners.values())
+    tokens = list(data.keys())
+    owner_parts, token_parts, amount_parts = [], [], []
+    for position, token_id in enumerate(tokens):
+        owners, amounts = token_columns(data[token_id])
+        owner_parts.append(np.asarray(owners, dtype=str))
+        token_parts.append(np.full(len(amounts), position, dtype=np.int64))
+        amount_parts.append(amounts)
+
+    if not tokens or not sum(len(part) for part in amount_parts):
+        empty = np.zeros(0, dtype=np.int64)
+        return OwnerMatrix(np.array([], dtype=str), tokens, empty, empty, np.zeros(0))
+
+    owners, owner_index = np.unique(np.concatenate(owner_parts), return_inverse=True)
+    token_index = np.concatenate(token_parts)
+    amounts = np.concatenate(amount_parts)
+
+    # An owner with several accounts for one token gets a single entry holding their total
+    pairs, pair_index = np.unique(owner_index * len(tokens) + token_index, return_inverse=True)
+    pair_amounts = np.bincount(pair_index, weights=amounts, minlength=len(pairs))
+    return OwnerMatrix(owners, tokens, pairs // len(tokens), pairs % len(tokens), pair_amounts)
+
+
+def plot_token_diversity_per_owner(owner_diversity, directory="figures"):
+    counts = owner_diversity
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.hist(counts, bins=range(1, max(counts) + 2), alpha=0.7, edgecolor='black', log=True)
+    ax.set_title("Distribution of Token Diversity per Owner")
+    ax.set_xlabel("Number of Different Tokens Owned")
+    ax.set_ylabel("Number of Owners")
+    ax.grid(True, which="both", ls="--", linewidth=0.5)
+
+    filename = "token_diversity_per_owner.webp"
+    return save_figure(fig, directory, filename)
+
+def plot_unique_owners_per_token(token_ids, holder_counts, metadata_results, directory="figures"):
+    # Assuming metadata_results is a dictionary where keys are token IDs and values contain token names
+    tokens = [metadata_results[token_id]['name'] if metadata_results.get(token_id) and 'name' in metadata_results[token_id] else token_id
+              for token_id in token_ids]
+    owner_counts = [int(count) for count in holder_counts]
 
     # Plotting
-    plt.figure(figsize=(12, 7))
-    bars = plt.bar(tokens, owner_counts, color='blue', alpha=0.7)
-    plt.yscale('log')  # Set logarithmic scale on y-axis
-    plt.xlabel('Token Name')
-    plt.ylabel('Number of Unique Owners (Log Scale)')
-    plt.title('Number of Unique Owners per Token')
-    plt.xticks(rotation=45)  # Rotate token labels to avoid overlap
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
+    fig = Figure(figsize=(12, 7))
+    ax = fig.subplots()
+    bars = ax.bar(tokens, owner_counts, color='blue', alpha=0.7)
+    ax.set_yscale('log')  # Set logarithmic scale on y-axis
+    ax.set_xlabel('Token Name')
+    ax.set_ylabel('Number of Unique Owners (Log Scale)')
+    ax.set_title('Number of Unique Owners per Token')
+    ax.tick_params(axis='x', rotation=45)  # Rotate token labels to avoid overlap
+    ax.grid(True, which="both", ls="--", linewidth=0.5)
 
     # Adding text on top of each bar
     for bar, count in zip(bars, owner_counts):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), f'{count}',
-                 ha='center', va='bottom', color='black', fontsize=8)
+        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), f'{count}',
+                ha='center', va='bottom', color='black', fontsize=8)
 
     # Save the plot
-    filename = "unique_owners_per_token_distribution.webp".replace(" ", "_")
-    save_plot(directory, filename)
+    filename = "unique_owners_per_token_distribution.webp"
+    return save_figure(fig, directory, filename)
+
+def build_render_data(data, owner_matrix, metadata_results, prices_dict, directory="figures"):
+    # Every registered histogram is computed here, one sorted index per distribution, so the workers
+    # only receive bin counts and statistics rather than holder arrays
+    token_layouts = plot_specs.layouts_for('token', output_only=True)
+    indexes = {token: AmountIndex.from_amounts(token_columns(data[token])[1]) for token in data}
+    owner_index = AmountIndex.from_amounts(owner_matrix.totals)
+    return {
+        'histograms': {token: plot_specs.compute_histograms(index, token_layouts) for token, index in indexes.items()},
+        'statistics': {token: index.statistics() for token, index in indexes.items()},
+        'owner_histograms': plot_specs.compute_histograms(owner_index, plot_specs.layouts_for('owner_totals', output_only=True)),
+        'owner_diversity': owner_matrix.diversity,
+        'holders_per_token': owner_matrix.holders_per_token,
+        'tokens': owner_matrix.tokens,
+        'metadata': metadata_results,
+        'prices': {token: prices_dict.get(token, 0.0) / 1_000_000_000 for token in data},
+        'directory': directory,
+    }
+
+def build_render_jobs(render_data):
+    jobs = [('unique_owners', None), ('token_diversity', None)]
+    for plot, spec in plot_specs.PLOT_SPECS.items():
+        if spec['output'] and spec['data'] == 'owner_totals':
+            jobs.append((plot, None))
+    for token, metadata in render_data['metadata'].items():
+        if metadata and token in render_data['histograms']:
+            jobs.extend((plot, token) for plot, spec in plot_specs.PLOT_SPECS.items() if spec['output'] and spec['data'] == 'token')
+    return jobs
+
+def render_histogram_job(render_data, plot, token):
+    layout = plot_specs.PLOT_SPECS[plot]['bins']
+    if token is None:
+        return plot_histogram(plot, render_data['owner_histograms'][layout], directory=render_data['directory'])
+    metadata = render_data['metadata'][token]
+    fields = {'name': metadata['name'], 'symbol': metadata['symbol'], 'price': render_data['prices'][token]}
+    return plot_histogram(plot, render_data['histograms'][token][layout], fields, render_data['statistics'][token], render_data['directory'])
+
+RENDERERS = {
+    'unique_owners': lambda render_data, token: plot_unique_owners_per_token(
+        render_data['tokens'], render_data['holders_per_token'], render_data['metadata'], render_data['directory']),
+    'token_diversity': lambda render_data, token: plot_token_diversity_per_owner(render_data['owner_diversity'], render_data['directory']),
+}
+
+# Set once per worker process by the pool initializer so the arrays are not pickled per figure
+_worker_render_data = None
+
+def _init_render_worker(render_data):
+    global _worker_render_data
+    _worker_render_data = render_data
+
+def _render_in_worker(job):
+    return render_job(_worker_render_data, job)
+
+def render_job(render_data, job):
+    plot, token = job
+    start = time.perf_counter()
+    if plot in RENDERERS:
+        filepath = RENDERERS[plot](render_data, token)
+    else:
+        filepath = render_histogram_job(render_data, plot, token)
+    if filepath:
+        save_thumbnail(filepath)
+    return plot, token, filepath, time.perf_counter() - start
+
+def read_json_file(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json_file(path, value):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def plotter_source_digest():
+    # Any change to the plotting code or the plot specs (bins, labels, styling) invalidates every cached figure
+    digest = hashlib.sha256()
+    for path in (os.path.abspath(__file__), os.path.abspath(plot_specs.__file__)):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def job_key(job):
+    plot, token = job
+    return f"{plot}:{token}" if token else plot
+
+def job_input_hash(render_data, job, source_digest):
+    plot, token = job
+    digest = hashlib.sha256(f"{source_digest}:{plot}:{render_data['directory']}".encode())
+    if token:
+        # The figure only depends on its bin counts and the statistics box, not on the raw balances
+        layout = plot_specs.PLOT_SPECS[plot]['bins']
+        digest.update(np.ascontiguousarray(render_data['histograms'][token][layout]['counts']).tobytes())
+        digest.update(json.dumps(render_data['statistics'][token], sort_keys=True).encode())
+        digest.update(json.dumps(render_data['metadata'][token], sort_keys=True).encode())
+        # Prices are shown with four decimals, so smaller moves do not change the figure
+        digest.update(f"{render_data['prices'][token]:.4f}".encode())
+    elif plot == 'token_diversity':
+        digest.update(np.ascontiguousarray(render_data['owner_diversity']).tobytes())
+    elif plot == 'unique_owners':
+        names = [(render_data['metadata'].get(token) or {}).get('name', token) for token in render_data['tokens']]
+        digest.update(json.dumps(names).encode())
+        digest.update(np.ascontiguousarray(render_data['holders_per_token']).tobytes())
+    else:
+        layout = plot_specs.PLOT_SPECS[plot]['bins']
+        digest.update(np.ascontiguousarray(render_data['owner_histograms'][layout]['counts']).tobytes())
+    return digest.hexdigest()
+
+def build_manifest(render_data, jobs, cache):
+    # One entry per figure this run produced, in job order; the dashboard build reads only this
+    figures = []
+    for plot, token in jobs:
+        entry = cache.get(job_key((plot, token)))
+        if entry is None:
+            continue
+        metadata = (render_data['metadata'].get(token) or {}) if token else {}
+        figures.append({
+            'plot': plot,
+            'token': token,
+            'name': metadata.get('name'),
+            'symbol': metadata.get('symbol'),
+            'file': os.path.basename(entry['file']),
+            'sha256': entry['digest'],
+            'thumbnail': os.path.basename(thumbnail_path(entry['file'])),
+            'thumbnail_sha256': entry['thumbnail_digest'],
+        })
+    return {'generated_at': int(time.time()), 'figures': figures}
+
+def render_figures(render_data, jobs, max_workers=MAX_RENDER_WORKERS, use_cache=True):
+    start = time.perf_counter()
+    directory = render_data['directory']
+    cache_path = os.path.join(directory, RENDER_CACHE_FILE)
+    cache = read_json_file(cache_path, {}) if use_cache else {}
+    source_digest = plotter_source_digest()
+
+    input_hashes = {job_key(job): job_input_hash(render_data, job, source_digest) for job in jobs}
+    stale_jobs = []
+    for job in jobs:
+        entry = cache.get(job_key(job))
+        if (entry and entry['input'] == input_hashes[job_key(job)] and os.path.exists(entry['file'])
+                and os.path.exists(thumbnail_path(entry['file']))):
+            continue
+        stale_jobs.append(job)
+
+    if max_workers == 1 or len(stale_jobs) <= 1:
+        results = [render_job(render_data, job) for job in stale_jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker, initargs=(render_data,)) as pool:
+            results = list(pool.map(_render_in_worker, stale_jobs))
+
+    changed = []
+    for plot, token, filepath, seconds in results:
+        metrics.REGISTRY.observe("figure_render_seconds", seconds, plot=plot)
+        key = job_key((plot, token))
+        if filepath is None:
+            cache.pop(key, None)
+            continue
+        digest = file_digest(filepath)
+        thumbnail_digest = file_digest(thumbnail_path(filepath))
+        # Rendering is not always byte-identical to the last upload, so only flag real changes
+        if cache.get(key, {}).get('digest') != digest:
+            changed.append(os.path.basename(filepath))
+        if cache.get(key, {}).get('thumbnail_digest') != thumbnail_digest:
+            changed.append(os.path.basename(thumbnail_path(filepath)))
+        cache[key] = {'input': input_hashes[key], 'file': filepath, 'digest': digest, 'thumbnail_digest': thumbnail_digest}
+
+    write_json_file(cache_path, cache)
+    write_json_file(os.path.join(directory, MANIFEST_FILE), build_manifest(render_data, jobs, cache))
+
+    metrics.REGISTRY.observe("render_seconds", time.perf_counter() - start)
+    metrics.REGISTRY.inc("figures_rendered_total", len(results))
+    metrics.REGISTRY.inc("figures_skipped_total", len(jobs) - len(stale_jobs))
+    print(f"Rendered {len(results)} of {len(jobs)} figures ({len(jobs) - len(stale_jobs)} unchanged, "
+          f"{len(changed)} files changed) in {time.perf_counter() - start:.1f}s")
+    return results, changed
+
+def run_plotter(filepath="token_data.json", prices_dict=None, directory="figures", max_workers=MAX_RENDER_WORKERS):
+    data = load_token_columns()
+    if not data:
+        data = load_token_data(filepath)
+    tokens = list(data.keys())
+    metadata_results = token_api.fetch_metadata(tokens)
+    if prices_dict is None:
+        prices_dict = token_api.fetch_prices(tokens)
+    # Aggregating owner holdings across tokens once for all the cross-token plots
+    with metrics.stage("aggregate") as run:
+        owner_matrix = aggregate_owner_data(data)
+        run.rows = len(owner_matrix.amounts)
+
+    render_data = build_render_data(data, owner_matrix, metadata_results, prices_dict, directory)
+    return render_figures(render_data, build_render_jobs(render_data), max_workers)
 
 def main():
     #url = "https://shdw-drive.genesysgo.net/3UgjUKQ1CAeaecg5CWk88q9jGHg8LJg9MAybp4pevtFz/token_data.json"
     #data = fetch_token_data(url)
-    filepath = "token_data.json"
-    data = load_token_data(filepath)
-    tokens = list(data.keys())
-    metadata_results = {token: fetch_token_metadata(token) for token in tokens}
-    prices_dict = fetch_token_prices(tokens)
-    # Aggregating detailed owner data from tokens
-    owner_details = aggregate_owner_data(data)
-    
-    plot_unique_owners_per_token(data,metadata_results)
-    # Plotting distributions based on new owner details
-    plot_total_tokens_per_owner(owner_details)
-    plot_total_tokens_per_owner_cumulative(owner_details)
-    plot_token_diversity_per_owner(owner_details)    
-
-    for token, metadata in metadata_results.items():
-        price = prices_dict.get(token, 0.0) / 1_000_000_000
-        plot_logarithmic_bins(data, token, metadata, price)
-        plot_pet_logarithmic_bins(data, token, metadata, price)
+    run_plotter("token_data.json")
 
 if __name__ == '__main__':
     main()
@@ -1,79 +1,42 @@
-import requests
-import json
+import asyncio
 import time
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-
-def fetch_token_metadata(mint):
-    url = f"https://api.sanctum.so/v1/metadata/{mint}"
-    response = requests.get(url)
-    return response.json()
-
-def fetch_token_prices(mints):
-    mints_query = '&input='.join(mints)
-    url = f"https://api.sanctum.so/v1/price?input={mints_query}"
-    response = requests.get(url)
-    return response.json()['prices']
-
-def fetch_token_accounts_from_solana_fm(mint):
-    url = f"https://api.solana.fm/v1/tokens/{mint}/holders"
-    headers = {"accept": "application/json"}
-    token_accounts = []
-    page = 1
-    total_items_collected = 0
-    total_items_available = float('inf')  # Initial assumption
-
-    while total_items_collected < total_items_available:
-        params = {
-            'page': page,
-            'pageSize': 1000  # You can adjust the pageSize if needed
-        }
-
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Failed to fetch data: {response.status_code} - {response.text}")
-            break
-
-        data = response.json()
-        if 'tokenAccounts' in data and data['tokenAccounts']:
-            token_accounts.extend(data['tokenAccounts'])
-            total_items_collected += len(data['tokenAccounts'])
-        else:
-            break
-
-        total_items_available = data.get('totalItemCount', 0)
-        print(f"Page {page}: Retrieved {len(data['tokenAccounts'])} accounts, Total collected: {total_items_collected}")
-        page += 1
-
-        # Sleep for 1 second to avoid overwhelming the API
-        time.sleep(2)
-
-    with open(f"{mint}_accounts.json", 'w') as f:
-        json.dump(token_accounts, f, indent=2)
-
-    return token_accounts
-
-def generate_plot(data, token_id, metadata, price):
-    # Correct the path to 'amount' in the data structure
-    amounts = [int(account['info']['tokenAmount']['amount']) for account in data]
-    readable_amounts = [amount / 10**metadata.get('decimals', 9) for amount in amounts]  # Adjust decimal places based on token metadata if available
-
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import holder_sources
+import token_api
+from holder_index import AmountIndex
+from http_client import HostRateLimiter, create_client, MAX_CONCURRENT_PAGES
+
+# Fetched mints waiting for the renderer; the queue bounds how many holder sets are in memory at once
+QUEUE_DEPTH = int(os.environ.get("ONESHOT_QUEUE_DEPTH", "2"))
+
+def build_index(amounts, decimals, metadata):
+    # Raw amounts scaled by the decimals the source reported, or the token metadata's
+    if decimals is None:
+        decimals = metadata.get('decimals', 9)
+    return AmountIndex.from_amounts(amounts.astype(float) / 10**decimals)
+
+def generate_plot(index, token_id, metadata, price):
     # Define min_amount and max_amount for the range of histogram
-    min_amount = min(readable_amounts) if readable_amounts else 0
+    min_amount = float(index.amounts[0]) if index.count else 0
     max_amount = 1000  # Adjust as needed based on your data analysis
 
     # Calculate basic statistics
-    mean_amount = np.mean(readable_amounts) if readable_amounts else 0
-    median_amount = np.median(readable_amounts) if readable_amounts else 0
+    statistics = index.statistics()
+    mean_amount = statistics['mean']
+    median_amount = statistics['median']
 
     # Percentiles
     percentiles = [99, 95, 90, 75, 50, 25]
-    percentile_values = np.percentile(readable_amounts, percentiles) if readable_amounts else [0] * len(percentiles)
+    percentile_values = index.percentile(percentiles)
 
-    # Create the histogram
+    # Create the histogram from the index instead of rescanning the amounts
+    edges = np.linspace(min_amount, max_amount, 11)
     plt.figure(figsize=(10, 5))
-    plt.hist(readable_amounts, bins=10, range=(min_amount, max_amount), color='blue', alpha=0.7)
+    plt.bar(edges[:-1], index.histogram(edges), width=np.diff(edges), align='edge', color='blue', alpha=0.7)
     plt.title(f"{metadata['name']} ({metadata['symbol']}) Token Distribution")
     plt.xlabel(f"Token Amount ({metadata['symbol']})")
     plt.ylabel('Number of Accounts')
@@ -94,26 +57,17 @@ def generate_plot(data, token_id, metadata, price):
     plt.close()
 
 
-def generate_distri_plot(data, token_id, metadata, price):
-    # Correct the path to 'amount' in the data structure and handle decimal places
-    sorted_amounts = sorted([int(account['info']['tokenAmount']['amount']) for account in data], reverse=True)
-    N = len(sorted_amounts)
-    decimals = metadata.get('decimals', 9)  # Default to 9 decimals if not specified in metadata
-    readable_amounts = np.array(sorted_amounts) / 10**decimals  # Adjust based on actual token decimals
-
-    # Calculate the percentage of each token amount compared to the total
-    percentages = 100 * readable_amounts / np.sum(readable_amounts)
+def generate_distri_plot(index, token_id, metadata, price):
+    N = index.count
 
     # Define the percentile bands
     percentiles = [25, 50, 75, 90, 95, 99, 100]
-    percentile_values = [np.percentile(readable_amounts, p) for p in percentiles]
-    percentile_ranges = [(percentile_values[i], percentile_values[i+1]) for i in range(len(percentiles)-1)]
+    percentile_values = index.percentile(percentiles)
 
-    # Calculate the average of the values within each percentile band
-    averages = []
-    for lower, upper in percentile_ranges:
-        band_values = readable_amounts[(readable_amounts >= lower) & (readable_amounts <= upper)]
-        averages.append(np.mean(band_values) if band_values.size > 0 else 0)
+    # Average of the values within each percentile band, from the index's per-bin counts and totals
+    counts = index.histogram(percentile_values)
+    sums = index.bin_sums(percentile_values)
+    averages = [total / count if count > 0 else 0 for total, count in zip(sums, counts)]
 
     # Create the plot with a logarithmic y-axis
     plt.figure(figsize=(10, 5))
@@ -131,10 +85,69 @@ def generate_distri_plot(data, token_id, metadata, price):
     plt.close()
 
     # Print the statistics to the console
-    print(f"Total Supply: {np.sum(readable_amounts):.2f} {metadata['symbol']}")
+    print(f"Total Supply: {index.total:.2f} {metadata['symbol']}")
     print(f"Total Accounts: {N}")
 
 
+def render_token(amounts, decimals, mint, metadata, price):
+    # Runs in the render process, so plotting overlaps with the next mint's download
+    start = time.perf_counter()
+    index = build_index(amounts, decimals, metadata)
+    generate_plot(index, mint, metadata, price)
+    generate_distri_plot(index, mint, metadata, price)
+    return time.perf_counter() - start
+
+async def fetch_holders(queue, tokens, client, limiter, metadata_results, prices):
+    # Producer: mints are fetched one after another (each with its pages in parallel) and handed to
+    # the renderer; put() waits while the queue is full, which caps memory at QUEUE_DEPTH holder sets
+    page_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+    # Pages are checkpointed in a throwaway directory and the columns stay in memory, so running this
+    # next to the data manager does not touch its checkpoints or {mint}_columns snapshots
+    with tempfile.TemporaryDirectory(prefix="oneshot-checkpoints-") as checkpoint_dir:
+        try:
+            for mint in tokens:
+                metadata = metadata_results[mint]
+                if not metadata:
+                    continue
+                print(f"Processing {metadata['name']} ({metadata['symbol']})")
+                fetched = await holder_sources.fetch_holders(client, limiter, mint, page_semaphore, checkpoint_dir)
+                if fetched is None:
+                    print(f"Skipping {metadata['name']} ({metadata['symbol']}): no source returned every holder")
+                    continue
+                # Owners are not plotted, so only the amounts wait in the queue
+                _, (_, amounts, decimals) = fetched
+                await queue.put((mint, metadata, prices.get(mint, 0) / 1e9, amounts, decimals))
+        finally:
+            await queue.put(None)
+
+async def render_holders(queue, pool):
+    # Consumer: renders each fetched mint in the worker process while the producer keeps downloading
+    loop = asyncio.get_running_loop()
+    render_seconds = 0.0
+    while (item := await queue.get()) is not None:
+        mint, metadata, price, amounts, decimals = item
+        try:
+            render_seconds += await loop.run_in_executor(pool, render_token, amounts, decimals, mint, metadata, price)
+            print(f"Completed {metadata['name']} ({metadata['symbol']})")
+        except Exception as e:
+            print(f"Failed to plot {metadata['name']} ({metadata['symbol']}): {e}")
+    return render_seconds
+
+async def run_pipeline(tokens, queue_depth=QUEUE_DEPTH):
+    start = time.perf_counter()
+    queue = asyncio.Queue(maxsize=queue_depth)
+    limiter = HostRateLimiter()
+    # One render process: pyplot keeps global state, and a single worker leaves the cores to the fetch
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        async with create_client() as client:
+            prices, metadata_results = await asyncio.gather(token_api.get_prices(tokens, client, limiter),
+                                                            token_api.get_metadata(tokens, client, limiter))
+            producer = asyncio.create_task(fetch_holders(queue, tokens, client, limiter, metadata_results, prices))
+            render_seconds = await render_holders(queue, pool)
+            await producer
+    print(f"Fetched and plotted {len(tokens)} tokens in {time.perf_counter() - start:.1f}s "
+          f"({render_seconds:.1f}s of it rendering)")
+
 def main():
     tokens = [
         'he1iusmfkpAdwvxLNGV8Y1iSbj4rUy6yMhEA3fotn9A',
@@ -144,18 +157,7 @@ def main():
         'jupSoLaHXQiZZTSfEWMTRRgpnyFm8f6sZdosWBjx93v',
     ]
 
-    prices = fetch_token_prices(tokens)
-
-    for mint in tokens:
-        metadata = fetch_token_metadata(mint)
-        print(f"Processing {metadata['name']} ({metadata['symbol']})")
-        #token_accounts = fetch_token_accounts(mint)
-        token_accounts = fetch_token_accounts_from_solana_fm(mint)
-        price = next((float(price['amount'])/1e9 for price in prices if price['mint'] == mint), 0)
-        generate_plot(token_accounts, mint, metadata, price)
-        generate_distri_plot(token_accounts, mint, metadata, price)
-        print(f"Completed {metadata['name']} ({metadata['symbol']})")
-        time.sleep(10)  # Sleep to manage API call frequency
+    asyncio.run(run_pipeline(tokens))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import numpy as np
+import snapshot_store
+
+# Written next to the columnar snapshots by the process stage: one index per mint
+INDEX_SUFFIX = "_index.npz"
+
+class AmountIndex:
+    # One token's holder balances sorted ascending plus a running-sum prefix. Bin counts, bin totals,
+    # percentiles and concentration measures are then searchsorted/prefix lookups, so answering a new
+    # bin layout never rescans the raw holder data.
+    def __init__(self, amounts, prefix=None, sum_squares=None, weighted_sum=None):
+        self.amounts = amounts
+        self.prefix = prefix if prefix is not None else np.concatenate(([0.0], np.cumsum(amounts)))
+        # Scalars behind std_dev and gini, computed once when the index is built
+        self.sum_squares = float(np.dot(amounts, amounts)) if sum_squares is None else float(sum_squares)
+        self.weighted_sum = float(np.dot(np.arange(1, amounts.size + 1), amounts)) if weighted_sum is None else float(weighted_sum)
+
+    @classmethod
+    def from_amounts(cls, amounts, min_amount=0.0):
+        amounts = np.asarray(amounts, dtype=float)
+        return cls(np.sort(amounts[amounts > min_amount]))
+
+    @classmethod
+    def merge(cls, indexes):
+        # Holders of several tokens pooled into one distribution, e.g. for the cross-LST views
+        return cls(np.sort(np.concatenate([index.amounts for index in indexes]), kind='mergesort'))
+
+    @property
+    def count(self):
+        return int(self.amounts.size)
+
+    @property
+    def total(self):
+        return float(self.prefix[-1])
+
+    def histogram(self, edges):
+        # Same bins as np.histogram: half-open except the last, which includes its right edge
+        edges = np.asarray(edges, dtype=float)
+        positions = np.searchsorted(self.amounts, edges, side='left')
+        positions[-1] = np.searchsorted(self.amounts, edges[-1], side='right')
+        return np.diff(positions)
+
+    def bin_sums(self, edges):
+        edges = np.asarray(edges, dtype=float)
+        positions = np.searchsorted(self.amounts, edges, side='left')
+        positions[-1] = np.searchsorted(self.amounts, edges[-1], side='right')
+        return np.diff(self.prefix[positions])
+
+    def percentile(self, q):
+        # Linear interpolation between closest ranks, matching np.percentile's default
+        if self.count == 0:
+            return np.zeros_like(np.asarray(q, dtype=float))
+        rank = np.asarray(q, dtype=float) / 100 * (self.count - 1)
+        lower = np.floor(rank).astype(int)
+        upper = np.minimum(lower + 1, self.count - 1)
+        return self.amounts[lower] + (self.amounts[upper] - self.amounts[lower]) * (rank - lower)
+
+    def top_share(self, n):
+        # Fraction of the supply held by the n largest holders
+        if self.total == 0:
+            return 0.0
+        n = min(max(int(n), 0), self.count)
+        return (self.total - float(self.prefix[self.count - n])) / self.total
+
+    def top_percent_share(self, percent):
+        return self.top_share(int(np.ceil(self.count * percent / 100)))
+
+    def nakamoto(self, threshold=0.5):
+        # Fewest holders that together hold more than the threshold share of the supply
+        if self.count == 0:
+            return 0
+        below = int(np.searchsorted(self.prefix, (1 - threshold) * self.total, side='left')) - 1
+        return self.count - max(below, 0)
+
+    def gini(self):
+        if self.count == 0 or self.total == 0:
+            return 0.0
+        return 2 * self.weighted_sum / (self.count * self.total) - (self.count + 1) / self.count
+
+    def statistics(self):
+        if self.count == 0:
+            return {'mean': 0.0, 'median': 0.0, 'sum': 0.0, 'count': 0, 'std_dev': 0.0, 'min': 0.0, 'max': 0.0}
+        mean = self.total / self.count
+        return {
+            'mean': mean,
+            'median': float(self.percentile(50)),
+            'sum': self.total,
+            'count': self.count,
+            'std_dev': float(np.sqrt(max(self.sum_squares / self.count - mean * mean, 0.0))),
+            'min': float(self.amounts[0]),
+            'max': float(self.amounts[-1]),
+        }
+
+    def save(self, path):
+        with open(f"{path}.tmp", 'wb') as f:
+            np.savez(f, amounts=self.amounts, prefix=self.prefix,
+                     scalars=np.array([self.sum_squares, self.weighted_sum]))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            sum_squares, weighted_sum = stored['scalars']
+            return cls(stored['amounts'], stored['prefix'], sum_squares, weighted_sum)
+
+def index_path(directory, mint):
+    return os.path.join(directory, f"{mint}{INDEX_SUFFIX}")
+
+def load_index(directory, mint):
+    path = index_path(directory, mint)
+    return AmountIndex.load(path) if os.path.exists(path) else None
+
+def build_indexes(directory, tokens, min_amount=0.01):
+    # Uses the same balance cut-off as token_data.json so both describe the same holders
+    built = 0
+    for mint in tokens:
+        if not snapshot_store.has_columns(directory, mint):
+            continue
+        AmountIndex.from_amounts(snapshot_store.load_amounts(directory, mint), min_amount).save(index_path(directory, mint))
+        built += 1
+    print(f"Built {built} holder indexes in {directory}")
+    return built
+
+if __name__ == "__main__":
+    # python holder_index.py [directory]: (re)build indexes for every columnar snapshot there
+    directory = sys.argv[1] if len(sys.argv) > 1 else "."
+    build_indexes(directory, snapshot_store.available_mints(directory))
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import snapshot_store
+
+# Start a fresh base after this many consecutive deltas so a load never replays a long chain
+MAX_DELTA_CHAIN = 7
+
+def holders_from_accounts(accounts):
+    holders = {}
+    decimals = None
+    for account in accounts:
+        info = account['info']
+        token_amount = info['tokenAmount']
+        # An owner can hold several token accounts for the same mint; the holder set tracks their total
+        holders[info['owner']] = holders.get(info['owner'], 0) + int(token_amount['amount'])
+        decimals = token_amount['decimals']
+    return holders, decimals
+
+def holders_from_columns(directory, mint):
+    decimals = snapshot_store.read_meta(directory, mint)['decimals']
+    owners = snapshot_store.read_column(directory, mint, "owner")
+    if not len(owners):
+        return {}, decimals
+    owner_table = snapshot_store.read_column(directory, mint, "owner_table")
+    # Sum in uint64 rather than bincount's float64 so large raw balances stay exact
+    order = np.argsort(owners, kind='stable')
+    sorted_owners = owners[order]
+    starts = np.flatnonzero(np.r_[True, sorted_owners[1:] != sorted_owners[:-1]])
+    totals = np.add.reduceat(snapshot_store.read_column(directory, mint, "amount")[order], starts)
+    holders = {str(owner_table[owner]): int(total) for owner, total in zip(sorted_owners[starts], totals)}
+    return holders, decimals
+
+def compute_delta(previous, current):
+    added = {owner: amount for owner, amount in current.items() if owner not in previous}
+    removed = [owner for owner in previous if owner not in current]
+    changed = {owner: amount for owner, amount in current.items() if owner in previous and previous[owner] != amount}
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+def apply_delta(holders, delta):
+    holders = dict(holders)
+    for owner in delta['removed']:
+        holders.pop(owner, None)
+    holders.update(delta['added'])
+    holders.update(delta['changed'])
+    return holders
+
+def delta_churn(delta, previous_count):
+    added = len(delta['added'])
+    removed = len(delta['removed'])
+    return {
+        'previous_holders': previous_count,
+        'holders': previous_count + added - removed,
+        'added': added,
+        'removed': removed,
+        'changed': len(delta['changed']),
+        'churn_rate': (added + removed) / previous_count if previous_count else 0.0,
+    }
+
+def snapshot_path(directory, mint):
+    return os.path.join(directory, f"{mint}_holders.json")
+
+def read_snapshot_record(directory, mint):
+    with open(snapshot_path(directory, mint), 'r') as f:
+        return json.load(f)
+
+def write_snapshot_record(directory, mint, record):
+    with open(snapshot_path(directory, mint), 'w') as f:
+        json.dump(record, f, separators=(',', ':'))
+
+def previous_snapshot_directory(directory, mint):
+    root = os.path.dirname(os.path.normpath(directory)) or '.'
+    current = os.path.basename(os.path.normpath(directory))
+    if not os.path.isdir(root):
+        return None
+    dates = sorted((name for name in os.listdir(root) if name.isdigit() and name < current), reverse=True)
+    for date in dates:
+        candidate = os.path.join(root, date)
+        if os.path.exists(snapshot_path(candidate, mint)):
+            return candidate
+    return None
+
+def load_snapshot(directory, mint):
+    # Walk back to the base, then replay the deltas forward
+    root = os.path.dirname(os.path.normpath(directory)) or '.'
+    chain = [read_snapshot_record(directory, mint)]
+    while chain[-1]['kind'] == 'delta':
+        chain.append(read_snapshot_record(os.path.join(root, chain[-1]['parent']), mint))
+
+    base = chain[-1]
+    if 'holders' in base:
+        holders = base['holders']
+    else:
+        holders, _ = holders_from_columns(os.path.join(root, base['date']), mint)
+    for record in reversed(chain[:-1]):
+        holders = apply_delta(holders, record)
+    return holders, chain[0]['decimals'], chain[0].get('chain', 0)
+
+def write_snapshot(directory, mint, holders, decimals):
+    date = os.path.basename(os.path.normpath(directory))
+    previous_directory = previous_snapshot_directory(directory, mint)
+    if previous_directory:
+        previous, previous_decimals, previous_chain = load_snapshot(previous_directory, mint)
+        delta = compute_delta(previous, holders)
+        churn = delta_churn(delta, len(previous))
+        if previous_chain < MAX_DELTA_CHAIN and previous_decimals == decimals:
+            record = {
+                'kind': 'delta',
+                'mint': mint,
+                'date': date,
+                'decimals': decimals,
+                'parent': os.path.basename(os.path.normpath(previous_directory)),
+                'chain': previous_chain + 1,
+                'churn': churn,
+                **delta,
+            }
+            write_snapshot_record(directory, mint, record)
+            # A rerun on a day that previously held a base must not leave stale columns behind
+            shutil.rmtree(snapshot_store.columns_path(directory, mint), ignore_errors=True)
+            return churn
+    else:
+        churn = delta_churn(compute_delta({}, holders), 0)
+
+    # Bases are stored as per-owner columns; the JSON record only carries the metadata
+    owners = list(holders)
+    snapshot_store.write_columns(directory, mint, owners, np.array([holders[owner] for owner in owners], dtype=np.uint64), decimals)
+    record = {'kind': 'base', 'mint': mint, 'date': date, 'decimals': decimals, 'chain': 0, 'churn': churn}
+    write_snapshot_record(directory, mint, record)
+    return churn
+
+def record_snapshots(directory, tokens):
+    churn = {}
+    for mint in tokens:
+        filename = f"{mint}_accounts.json"
+        if snapshot_store.has_columns(".", mint):
+            holders, decimals = holders_from_columns(".", mint)
+        elif os.path.exists(filename):
+            with open(filename, 'r') as f:
+                holders, decimals = holders_from_accounts(json.load(f))
+        else:
+            continue
+        churn[mint] = write_snapshot(directory, mint, holders, decimals)
+        print(f"{mint}: {churn[mint]['holders']} holders, +{churn[mint]['added']} -{churn[mint]['removed']} ~{churn[mint]['changed']}")
+
+    if churn:
+        with open(os.path.join(directory, "holder_churn.json"), 'w') as f:
+            json.dump(churn, f, indent=2)
+    return churn
+
+if __name__ == "__main__":
+    # Rebuild the full holder set for one mint from a dated directory, e.g. data/20240601 <mint>
+    holders, decimals, _ = load_snapshot(sys.argv[1], sys.argv[2])
+    json.dump({'decimals': decimals, 'holders': holders}, sys.stdout)
@@ -0,0 +1,186 @@
+import asyncio
+import math
+import os
+import time
+import httpx
+import numpy as np
+import metrics
+from checkpoints import CHECKPOINT_DIR, PageCheckpoint
+from http_client import get_json, post_json
+
+# Where a mint's token accounts come from. Every source pages through the accounts with retries and
+# a checkpoint, and returns the same (owners, raw amounts, decimals) columns that
+# snapshot_store.write_columns takes, so the rest of the pipeline does not care which one ran.
+SOLANA_FM_URL = os.environ.get("SOLANA_FM_URL", "https://api.solana.fm")
+# e.g. https://mainnet.helius-rpc.com/?api-key=...; the Helius source is skipped while unset
+HELIUS_RPC_URL = os.environ.get("HELIUS_RPC_URL", "")
+PAGE_SIZE = 1000
+HELIUS_PAGE_LIMIT = 1000
+
+# Sources in the order they are tried; a mint listed in HOLDER_SOURCE_OVERRIDES ("mint=helius,...")
+# tries its own source first and falls back to the rest
+HOLDER_SOURCES = [name.strip() for name in os.environ.get("HOLDER_SOURCES", "solanafm,helius").split(",") if name.strip()]
+MINT_SOURCES = dict(item.strip().split("=", 1) for item in os.environ.get("HOLDER_SOURCE_OVERRIDES", "").split(",") if "=" in item)
+
+class RpcError(Exception):
+    pass
+
+def account_rows(accounts):
+    # SolanaFM account objects reduced to the [owner, raw amount] rows every source checkpoints
+    return [[account['info']['owner'], account['info']['tokenAmount']['amount']] for account in accounts]
+
+def rows_to_columns(rows, decimals):
+    owners = [row[0] for row in rows]
+    amounts = np.array([int(row[1]) for row in rows], dtype=np.uint64)
+    return owners, amounts, decimals
+
+def checkpoint_root(source_name, checkpoint_dir=None):
+    # One checkpoint per source, so falling back to another source keeps the first one's progress
+    return os.path.join(checkpoint_dir or CHECKPOINT_DIR, source_name)
+
+class SolanaFmSource:
+    # GET /v1/tokens/{mint}/holders?page=&pageSize=. Page 1 gives the total, so the remaining pages
+    # are requested concurrently.
+    name = "solanafm"
+
+    def available(self):
+        return bool(SOLANA_FM_URL)
+
+    async def fetch_page(self, client, limiter, mint, page):
+        url = f"{SOLANA_FM_URL}/v1/tokens/{mint}/holders"
+        params = {
+            'page': page,
+            'pageSize': PAGE_SIZE
+        }
+        data = await get_json(client, limiter, url, params=params)
+        return list(data.get('tokenAccounts') or []), data.get('totalItemCount', 0)
+
+    async def fetch(self, client, limiter, mint, page_semaphore, checkpoint_dir=None):
+        # Returns the mint's columns once every page is in, or None when pages are still missing; the
+        # pages that did arrive stay checkpointed on disk so the next attempt only requests the rest
+        checkpoint = PageCheckpoint(mint, checkpoint_root(self.name, checkpoint_dir))
+        if checkpoint.complete:
+            checkpoint.clear()
+        if checkpoint.state is None:
+            async with page_semaphore:
+                first_accounts, total_items_available = await self.fetch_page(client, limiter, mint, 1)
+            # The API may cap pageSize below what we ask for, so size the rest of the walk off page 1
+            page_size = len(first_accounts) or PAGE_SIZE
+            total_pages = math.ceil(total_items_available / page_size) if first_accounts else 0
+            checkpoint.start(total_items_available, page_size, total_pages)
+            if first_accounts:
+                checkpoint.state['decimals'] = first_accounts[0]['info']['tokenAmount']['decimals']
+                checkpoint.save_state()
+                checkpoint.write_page(1, account_rows(first_accounts))
+        else:
+            print(f"{mint}: resuming from checkpoint, {len(checkpoint.completed_pages())} of {checkpoint.state['total_pages']} pages already fetched")
+
+        async def fetch_page(page):
+            async with page_semaphore:
+                accounts, _ = await self.fetch_page(client, limiter, mint, page)
+            checkpoint.write_page(page, account_rows(accounts))
+
+        missing = checkpoint.missing_pages()
+        results = await asyncio.gather(*(fetch_page(page) for page in missing), return_exceptions=True)
+        failed = [page for page, result in zip(missing, results) if isinstance(result, Exception)]
+        for page, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"Failed to fetch token accounts for {mint} on page {page}: {result}")
+
+        total_pages = checkpoint.state['total_pages']
+        if failed:
+            print(f"{mint}: {len(failed)} of {total_pages} pages still missing; the rest are checkpointed for the next attempt")
+            return None
+        rows = checkpoint.read_rows()
+        print(f"{mint}: Retrieved {len(rows)} of {checkpoint.state['total_items']} accounts over {total_pages} pages")
+        checkpoint.mark_complete()
+        return rows_to_columns(rows, checkpoint.state.get('decimals'))
+
+class HeliusSource:
+    # Helius DAS getTokenAccounts over JSON-RPC. Pages are chained by cursor so they are fetched one
+    # after another; the next cursor is checkpointed with each page. getTokenAccounts does not
+    # report decimals, so they come from getTokenSupply.
+    name = "helius"
+
+    def available(self):
+        return bool(HELIUS_RPC_URL)
+
+    async def rpc(self, client, limiter, method, params):
+        body = {'jsonrpc': '2.0', 'id': 'optimisoor', 'method': method, 'params': params}
+        data = await post_json(client, limiter, HELIUS_RPC_URL, body)
+        if data.get('error'):
+            raise RpcError(f"{method}: {data['error'].get('message', data['error'])}")
+        return data['result']
+
+    async def fetch(self, client, limiter, mint, page_semaphore, checkpoint_dir=None):
+        checkpoint = PageCheckpoint(mint, checkpoint_root(self.name, checkpoint_dir))
+        if checkpoint.complete:
+            checkpoint.clear()
+        checkpoint.start(None, HELIUS_PAGE_LIMIT, None)
+        if checkpoint.state.get('decimals') is None:
+            supply = await self.rpc(client, limiter, "getTokenSupply", [mint])
+            checkpoint.state['decimals'] = supply['value']['decimals']
+            checkpoint.save_state()
+        page = len(checkpoint.completed_pages())
+        if page:
+            print(f"{mint}: resuming from checkpoint after {page} pages")
+
+        while not checkpoint.state.get('exhausted'):
+            params = {'mint': mint, 'limit': HELIUS_PAGE_LIMIT}
+            if checkpoint.state.get('cursor'):
+                params['cursor'] = checkpoint.state['cursor']
+            try:
+                async with page_semaphore:
+                    result = await self.rpc(client, limiter, "getTokenAccounts", params)
+            except (httpx.HTTPError, RpcError) as e:
+                print(f"Failed to fetch token accounts for {mint} after page {page}: {e}; progress is checkpointed")
+                return None
+            accounts = result.get('token_accounts') or []
+            if accounts:
+                page += 1
+                checkpoint.write_page(page, [[account['owner'], account['amount']] for account in accounts])
+            checkpoint.state['cursor'] = result.get('cursor')
+            checkpoint.state['exhausted'] = not accounts or not result.get('cursor')
+            checkpoint.save_state()
+
+        rows = checkpoint.read_rows()
+        print(f"{mint}: Retrieved {len(rows)} accounts over {page} pages")
+        checkpoint.mark_complete()
+        return rows_to_columns(rows, checkpoint.state['decimals'])
+
+SOURCES = {source.name: source for source in (SolanaFmSource(), HeliusSource())}
+
+def sources_for(mint):
+    names = list(HOLDER_SOURCES)
+    preferred = MINT_SOURCES.get(mint)
+    if preferred in SOURCES:
+        names = [preferred] + [name for name in names if name != preferred]
+    return [SOURCES[name] for name in names if name in SOURCES and SOURCES[name].available()]
+
+def recently_fetched(mint):
+    return any(PageCheckpoint(mint, checkpoint_root(name)).complete for name in SOURCES)
+
+def clear_completed(mints):
+    for mint in mints:
+        for name in SOURCES:
+            checkpoint = PageCheckpoint(mint, checkpoint_root(name))
+            if checkpoint.complete:
+                checkpoint.clear()
+
+async def fetch_holders(client, limiter, mint, page_semaphore, checkpoint_dir=None):
+    # Tries the mint's sources in order and returns (source name, columns), or None if every one failed.
+    # checkpoint_dir keeps a caller's pages apart from the scheduler's shared checkpoints.
+    for source in sources_for(mint):
+        start = time.perf_counter()
+        try:
+            columns = await source.fetch(client, limiter, mint, page_semaphore, checkpoint_dir)
+        except (httpx.HTTPError, RpcError, KeyError, ValueError) as e:
+            print(f"{mint}: {source.name} failed: {e}")
+            columns = None
+        if columns is not None:
+            metrics.REGISTRY.observe("holder_source_seconds", time.perf_counter() - start, source=source.name)
+            metrics.REGISTRY.inc("holder_source_rows_total", len(columns[0]), source=source.name)
+            return source.name, columns
+        metrics.REGISTRY.inc("holder_source_failures_total", source=source.name)
+        print(f"{mint}: {source.name} did not return every holder")
+    return None
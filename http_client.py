@@ -0,0 +1,117 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import httpx
+import metrics
+
+# How many mints are fetched at once, and how many page requests may be in flight overall
+MAX_CONCURRENT_MINTS = 4
+MAX_CONCURRENT_PAGES = 8
+
+# Failed requests are retried with jittered exponential backoff, or after the server's Retry-After
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_AFTER_MAX = 300.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Token-bucket limits per host as (requests per second, burst size)
+RATE_LIMITS = {
+    "api.solana.fm": (4, 4),
+    "api.sanctum.so": (5, 5),
+    "mainnet.helius-rpc.com": (10, 10),
+}
+DEFAULT_RATE_LIMIT = (2, 2)
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    def __init__(self, limits=None, default=DEFAULT_RATE_LIMIT):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self.default = default
+        self.buckets = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            rate, capacity = self.limits.get(host, self.default)
+            self.buckets[host] = TokenBucket(rate, capacity)
+        await self.buckets[host].acquire()
+
+def create_client(max_connections=MAX_CONCURRENT_PAGES + MAX_CONCURRENT_MINTS):
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30.0), headers={"accept": "application/json"})
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt):
+    # Full jitter, so pages that failed together do not all retry at the same moment
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+async def request_json(client, limiter, method, url, params=None, body=None, retries=None):
+    retries = MAX_RETRIES if retries is None else retries
+    parsed = urlparse(url)
+    host = parsed.netloc
+    for attempt in range(retries + 1):
+        await limiter.wait(url)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, params=params, json=body)
+        except httpx.TransportError as e:
+            metrics.record_upstream_request(host, time.perf_counter() - start, "error", 0)
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            reason = repr(e)
+        else:
+            metrics.record_upstream_request(host, time.perf_counter() - start, response.status_code, len(response.content))
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response.json()
+            retry_after = retry_after_seconds(response)
+            if retry_after is None:
+                delay = backoff_delay(attempt)
+            else:
+                delay = min(retry_after, RETRY_AFTER_MAX) + random.uniform(0, BACKOFF_BASE)
+            reason = f"HTTP {response.status_code}"
+        metrics.REGISTRY.inc("upstream_retries_total", host=host)
+        # The query string is left out of the log since RPC URLs carry the API key there
+        print(f"Request to {host}{parsed.path} failed ({reason}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+async def get_json(client, limiter, url, params=None, retries=None):
+    return await request_json(client, limiter, "GET", url, params=params, retries=retries)
+
+async def post_json(client, limiter, url, body, retries=None):
+    return await request_json(client, limiter, "POST", url, body=body, retries=retries)
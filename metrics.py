@@ -0,0 +1,175 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Comma separated stage names (or "all") to run under cProfile; profiles land in PROFILE_DIR
+PROFILE_STAGES = {name.strip() for name in os.environ.get("PROFILE_STAGES", "").split(",") if name.strip()}
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+RUN_REPORT_FILE = "run_report.json"
+
+class Metrics:
+    # Process-wide counters, gauges and summaries (count/sum/max), each keyed by name and labels.
+    # Cheap enough to update from hot paths; everything is guarded by one lock.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.summaries = {}
+            self.started = time.time()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            count, total, peak = self.summaries.get(key, (0, 0.0, value))
+            self.summaries[key] = (count + 1, total + value, max(peak, value))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        def entry(key, **values):
+            return {'name': key[0], 'labels': dict(key[1]), **values}
+        with self.lock:
+            return {
+                'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'counters': [entry(key, value=value) for key, value in sorted(self.counters.items())],
+                'gauges': [entry(key, value=value) for key, value in sorted(self.gauges.items())],
+                'summaries': [entry(key, count=count, sum=round(total, 6), max=round(peak, 6))
+                              for key, (count, total, peak) in sorted(self.summaries.items())],
+            }
+
+    def prometheus(self, prefix="optimisoor_", extra_gauges=()):
+        # Prometheus text exposition; summaries become _count/_sum plus a separate _max gauge
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def series(name, labels, value):
+            label_text = ",".join(f'{key}="{escape(val)}"' for key, val in labels)
+            return f"{prefix}{name}{{{label_text}}} {value}" if label_text else f"{prefix}{name} {value}"
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items()) + sorted(extra_gauges)
+            summaries = sorted(self.summaries.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}{name} counter")
+                typed.add(name)
+            lines.append(series(name, labels, value))
+        for (name, labels), value in gauges:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}{name} gauge")
+                typed.add(name)
+            lines.append(series(name, labels, value))
+        for (name, labels), (count, total, peak) in summaries:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}{name} summary")
+                typed.add(name)
+            lines.append(series(f"{name}_count", labels, count))
+            lines.append(series(f"{name}_sum", labels, round(total, 6)))
+        # The maximum is not part of the summary type, so it is exposed as its own gauge family
+        for (name, labels), (count, total, peak) in summaries:
+            if f"{name}_max" not in typed:
+                lines.append(f"# TYPE {prefix}{name}_max gauge")
+                typed.add(f"{name}_max")
+            lines.append(series(f"{name}_max", labels, round(peak, 6)))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Metrics()
+
+class StageRun:
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+
+def profiling_enabled(name):
+    return "all" in PROFILE_STAGES or name in PROFILE_STAGES
+
+def write_profile(name, profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+    profile.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(15)
+    print(f"Profile for stage {name} written to {path}\n{summary.getvalue()}")
+
+@contextmanager
+def stage(name, registry=REGISTRY):
+    # Times a pipeline stage and counts the rows it reports through the yielded StageRun. The thread
+    # is renamed for the duration so py-spy dumps show which stage a thread is in.
+    run = StageRun(name)
+    thread = threading.current_thread()
+    previous_name = thread.name
+    thread.name = f"stage:{name}"
+    profile = cProfile.Profile() if profiling_enabled(name) else None
+    start = time.perf_counter()
+    if profile:
+        profile.enable()
+    try:
+        yield run
+    except Exception:
+        registry.inc("stage_failures_total", stage=name)
+        raise
+    finally:
+        if profile:
+            profile.disable()
+        seconds = time.perf_counter() - start
+        thread.name = previous_name
+        registry.observe("stage_seconds", seconds, stage=name)
+        if run.rows:
+            registry.inc("rows_processed_total", run.rows, stage=name)
+            registry.set("rows_per_second", round(run.rows / seconds, 1) if seconds else 0.0, stage=name)
+        if profile:
+            write_profile(name, profile)
+
+def record_upstream_request(host, seconds, status, size, registry=REGISTRY):
+    registry.observe("upstream_request_seconds", seconds, host=host)
+    registry.inc("upstream_requests_total", host=host, status=status)
+    if size:
+        registry.inc("upstream_bytes_total", size, host=host)
+
+def write_run_report(directory, stages=(), registry=REGISTRY, reset=True):
+    # One entry per scheduler wave, appended to data/YYYYMMDD/run_report.json
+    path = os.path.join(directory, RUN_REPORT_FILE)
+    runs = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            runs = json.load(f)
+    runs.append({'finished': datetime.now().isoformat(timespec='seconds'), 'stages': list(stages), **registry.snapshot()})
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(runs, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    if reset:
+        registry.reset()
+    return path
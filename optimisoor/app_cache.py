@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+class CachedValue:
+    # Holds one upstream value with a TTL. Concurrent callers share a single in-flight load
+    # (single-flight), and once a value exists callers get it immediately while a stale value
+    # is refreshed in the background.
+    def __init__(self, name, loader, ttl):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = None
+        self.expires_at = 0.0
+        self.refreshing = None
+        self.last_error = None
+
+    @property
+    def is_fresh(self):
+        return self.loaded_at is not None and time.monotonic() < self.expires_at
+
+    async def get(self):
+        if self.loaded_at is None:
+            return await self.refresh()
+        if not self.is_fresh:
+            self.refresh_in_background()
+        return self.value
+
+    async def refresh(self):
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self._load())
+        # Shielded so a cancelled request does not cancel the load other callers are waiting on
+        return await asyncio.shield(self.refreshing)
+
+    def refresh_in_background(self):
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self._load())
+            self.refreshing.add_done_callback(self._log_failure)
+
+    def _log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background refresh of {self.name} failed: {task.exception()}")
+
+    async def _load(self):
+        try:
+            value = await self.loader()
+        except Exception as e:
+            self.last_error = repr(e)
+            raise
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.expires_at = self.loaded_at + self.ttl
+        self.last_error = None
+        return value
+
+    def status(self):
+        return {
+            'fresh': self.is_fresh,
+            'age_seconds': None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1),
+            'ttl_seconds': self.ttl,
+            'last_error': self.last_error,
+        }
+
+async def refresh_forever(caches, interval):
+    # Keeps every cache warm so requests are normally served without touching upstream
+    while True:
+        for cache in caches:
+            if not cache.is_fresh:
+                try:
+                    await cache.refresh()
+                except Exception as e:
+                    print(f"Refresh of {cache.name} failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,44 @@
+import io
+import base64
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import plot_specs
+
+# Synchronous renderers run inside the render pool's worker processes. Each one builds its own
+# Figure instead of using pyplot, so no global plotting state is shared between renders.
+
+def figure_to_base64(fig, format='png'):
+    buf = io.BytesIO()
+    fig.savefig(buf, format=format)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def render_percentile_scatter_plot(index, metadata):
+    sorted_amounts = index.amounts[::-1]  # The index is sorted ascending; plot in descending order
+
+    # Generating x-values (percentiles) for each point
+    n = len(sorted_amounts)
+    percentiles = np.arange(1, n+1) / n * 100  # Calculate percentiles for each data point
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.scatter(percentiles, sorted_amounts, color='blue', alpha=0.7)
+
+    # Setting logarithmic scale for y-axis
+    ax.set_yscale('log')
+    ax.set_ylim(np.min(sorted_amounts[sorted_amounts > 0]), np.max(sorted_amounts))  # Avoid log(0) error by excluding zeros
+
+    # Plot aesthetics
+    ax.set_title(f"{metadata['name']} ({metadata['symbol']}) Distribution - Log Scale")
+    ax.set_xlabel("Percentile")
+    ax.set_ylabel(f"Token Amount ({metadata['symbol']}) [Log Scale]")
+    ax.grid(True, which="both", ls="--", linewidth=0.5)
+    return figure_to_base64(fig)
+
+def render_histogram(plot, histogram, fields):
+    # A plot_specs chart from bins computed in the app process, so only the counts are sent here
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    plot_specs.draw_histogram(ax, plot_specs.PLOT_SPECS[plot], histogram, fields)
+    return figure_to_base64(fig)
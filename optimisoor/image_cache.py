@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+import httpx
+import metrics
+
+# Figure names as written by data_plotter; anything else is never forwarded to the origin
+FIGURE_NAME = re.compile(r'^[A-Za-z0-9_.-]+\.webp$')
+META_SUFFIX = ".meta.json"
+# Shortest ?v= accepted as naming a figure's digest; the dashboard build uses 12 characters
+MIN_VERSION_LENGTH = 8
+
+class OriginUnavailable(Exception):
+    pass
+
+def valid_version(version):
+    return bool(version) and len(version) >= MIN_VERSION_LENGTH
+
+def matches_version(entry, version):
+    return valid_version(version) and entry['sha256'].startswith(version)
+
+class ImageCache:
+    # Figures proxied from the origin and kept on local disk, evicted least recently used once they
+    # take more than max_bytes. An entry checked within ttl is served without contacting the origin;
+    # an older one is revalidated with its ETag / Last-Modified, so an unchanged figure costs a 304
+    # instead of a download. A request naming the stored digest (?v=) skips revalidation entirely.
+    # Concurrent misses for one figure share a single fetch.
+    def __init__(self, directory, origin, upstream, max_bytes, ttl):
+        self.directory = directory
+        self.origin = origin
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.loading = {}
+        self.load_entries()
+
+    def load_entries(self):
+        # Recency is not persisted per hit; after a restart the last check time stands in for it
+        # The directory is only created by the first write, so importing the app leaves the tree alone
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(META_SUFFIX):
+                name = filename[:-len(META_SUFFIX)]
+                if not os.path.exists(self.path(name)):
+                    continue
+                with open(os.path.join(self.directory, filename), 'r') as f:
+                    entries.append((name, json.load(f)))
+        for name, entry in sorted(entries, key=lambda item: item[1]['checked_at']):
+            self.entries[name] = entry
+            self.total_bytes += entry['size']
+        self.evict()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_meta(self, name, entry):
+        path = self.path(name) + META_SUFFIX
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+    def write(self, name, body, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.path(name)}.tmp", 'wb') as f:
+            f.write(body)
+        os.replace(f"{self.path(name)}.tmp", self.path(name))
+        self.write_meta(name, entry)
+
+    def read(self, name):
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def forget(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            self.total_bytes -= entry['size']
+
+    def remove(self, name):
+        self.forget(name)
+        for path in (self.path(name), self.path(name) + META_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        # The newest entry always stays, even if it alone is over the budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name = next(iter(self.entries))
+            self.remove(name)
+            metrics.REGISTRY.inc("image_cache_evictions_total")
+        metrics.REGISTRY.set("image_cache_bytes", self.total_bytes)
+
+    async def get(self, name, version=None):
+        # Returns (entry, body), or None when the origin has no such figure
+        entry = self.entries.get(name)
+        if entry is not None:
+            # A digest the entry does not match means the page expects a newer figure, so go to the origin
+            current = matches_version(entry, version) if valid_version(version) else time.time() - entry['checked_at'] < self.ttl
+            if current:
+                body = await asyncio.to_thread(self.read, name)
+                if body is not None:
+                    self.entries.move_to_end(name)
+                    metrics.REGISTRY.inc("image_cache_requests_total", result="hit")
+                    return entry, body
+                # Evicted between the lookup and the read
+                self.remove(name)
+        if name not in self.loading:
+            self.loading[name] = asyncio.create_task(self.fetch(name))
+            self.loading[name].add_done_callback(lambda task: self.loading.pop(name, None))
+        # Shielded so a cancelled request does not cancel the fetch other callers are waiting on
+        return await asyncio.shield(self.loading[name])
+
+    async def fetch(self, name):
+        entry = self.entries.get(name)
+        body = await asyncio.to_thread(self.read, name) if entry else None
+        headers = {}
+        if body is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = await self.upstream.get(self.origin + name, headers=headers)
+        except httpx.HTTPError as e:
+            response = None
+            error = repr(e)
+        else:
+            error = f"origin returned {response.status_code}"
+
+        if response is not None and response.status_code == 304 and body is not None:
+            entry['checked_at'] = time.time()
+            await asyncio.to_thread(self.write_meta, name, entry)
+            self.entries.move_to_end(name)
+            metrics.REGISTRY.inc("image_cache_requests_total", result="revalidated")
+            return entry, body
+        if response is not None and response.status_code == 404:
+            self.remove(name)
+            return None
+        if response is None or response.status_code != 200:
+            if body is not None:
+                # A figure that is a little stale beats a broken image while the origin is down
+                print(f"Serving stale {name}: {error}")
+                metrics.REGISTRY.inc("image_cache_requests_total", result="stale")
+                return entry, body
+            raise OriginUnavailable(f"{name}: {error}")
+
+        body = response.content
+        entry = {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'sha256': hashlib.sha256(body).hexdigest(),
+            'size': len(body),
+            'checked_at': time.time(),
+        }
+        await asyncio.to_thread(self.write, name, body, entry)
+        self.forget(name)
+        self.entries[name] = entry
+        self.total_bytes += entry['size']
+        self.evict()
+        metrics.REGISTRY.inc("image_cache_requests_total", result="fetched")
+        return entry, body
+
+    def status(self):
+        return {'entries': len(self.entries), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes, 'ttl_seconds': self.ttl}
@@ -1,16 +1,103 @@
-import httpx
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.templating import Jinja2Templates
 import asyncio
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
-
-app = FastAPI()
-templates = Jinja2Templates(directory="templates")
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import snapshot_store
+import metrics
+import timeseries
+import plot_specs
+import token_api
+from http_client import HostRateLimiter
+from holder_index import AmountIndex, load_index
+from app_cache import CachedValue, refresh_forever
+from render_pool import RenderPool, RenderQueueFull
+from upstream import UpstreamClient
+from static_page import StaticPage
+from image_cache import FIGURE_NAME, ImageCache, OriginUnavailable, matches_version
+import dashboard_build
+import figures
+import stats
+
+# When set, token data is read from local columnar snapshots instead of downloading token_data.json
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR")
+# Daily per-token aggregates written by the data manager's holders stage
+TIMESERIES_DIR = os.environ.get("TIMESERIES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeseries.TIMESERIES_DIR))
+TOKEN_DATA_URL = os.environ.get("TOKEN_DATA_URL", "https://shdw-drive.genesysgo.net/3UgjUKQ1CAeaecg5CWk88q9jGHg8LJg9MAybp4pevtFz/token_data.json")
+
+# Prebuilt dashboard pages written by dashboard_build
+DASHBOARD_DIR = os.environ.get("DASHBOARD_DIR", dashboard_build.DASHBOARD_DIR)
+dashboard_page = StaticPage(DASHBOARD_DIR)
+
+# Figures behind /images are fetched from the drive once and served from a bounded local disk cache
+FIGURES_ORIGIN = os.environ.get("FIGURES_ORIGIN", "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/")
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache", "images"))
+IMAGE_CACHE_BYTES = int(os.environ.get("IMAGE_CACHE_MB", "256")) * 1024 * 1024
+# How long a cached figure is served before it is revalidated against the drive; versioned URLs never are
+IMAGE_TTL = 5 * 60
+IMAGE_MAX_AGE = 5 * 60
+
+# How long each cached upstream value is served before the background task refreshes it
+DATASET_TTL = 30 * 60
+TOKEN_LIST_TTL = 30 * 60
+PRICES_TTL = 5 * 60
+FIGURES_TTL = 5 * 60
+STATS_TTL = 5 * 60
+# Browsers may reuse API responses for this long before revalidating with their ETag
+API_MAX_AGE = 60
+CACHE_REFRESH_INTERVAL = 30
+
+# Figure rendering runs in worker processes; RENDER_QUEUE caps renders queued or running at once
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0")) or None
+RENDER_QUEUE = int(os.environ.get("RENDER_QUEUE", "32"))
+render_pool = RenderPool(RENDER_WORKERS, RENDER_QUEUE)
+
+# Shared client for every upstream call, with a cap on concurrent requests per host
+upstream = UpstreamClient(host_limits={"api.sanctum.so": 4, "shdw-drive.genesysgo.net": 2})
+# Metadata and prices go through token_api (and its disk cache) on the same connections and host caps
+token_api_limiter = HostRateLimiter()
+image_cache = ImageCache(IMAGE_CACHE_DIR, FIGURES_ORIGIN, upstream, IMAGE_CACHE_BYTES, IMAGE_TTL)
+
+@asynccontextmanager
+async def lifespan(app):
+    await upstream.start()
+    render_pool.start()
+    refresher = asyncio.create_task(refresh_forever(
+        [dataset_cache, metadata_cache, prices_cache, stats_cache, figures_cache], CACHE_REFRESH_INTERVAL))
+    yield
+    refresher.cancel()
+    render_pool.shutdown()
+    await upstream.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(RenderQueueFull)
+async def render_queue_full(request: Request, exc: RenderQueueFull):
+    return JSONResponse(status_code=503, content={"detail": "Render queue is full"}, headers={"Retry-After": "5"})
+
+@app.exception_handler(OriginUnavailable)
+async def origin_unavailable(request: Request, exc: OriginUnavailable):
+    return JSONResponse(status_code=502, content={"detail": "Figure origin is unavailable"}, headers={"Retry-After": "30"})
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path so per-mint URLs do not each get a series
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.REGISTRY.observe("http_request_seconds", time.perf_counter() - start, path=path)
+    metrics.REGISTRY.inc("http_requests_total", path=path, status=response.status_code)
+    return response
+
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
 
 origins = ["*"]
 
@@ -28,230 +115,227 @@ def read_root():
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def show_dashboard(request: Request):
-    # Hardcoded image URLs
-    overall_graphs = {
-        "total tokens per owner distribution": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/total_tokens_per_owner_distribution.webp",
-        "cumulative total tokens per owner distribution": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/cumulative_total_tokens_per_owner_distribution.webp",
-        "token diversity per owner": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/token_diversity_per_owner.webp",
-        "unique owners per token distribution": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/unique_owners_per_token_distribution.webp"
-    }
-
-    lst_graphs = {
-        "Juicy SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Juicy_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Juicy_SOL_log_bins.webp"
-        },
-        "Infinity": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Infinity_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Infinity_log_bins.webp"
-        },
-        "Jupiter Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Jupiter_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Jupiter_Staked_SOL_log_bins.webp"
-        },
-        "Laine SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Laine_High_Yield_LST_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Laine_High_Yield_LST_log_bins.webp"
-        },
-        "JitoSol": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Jito_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Jito_Staked_SOL_log_bins.webp"
-        },
-        "fpLee SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/FP_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/FP_SOL_log_bins.webp"
-        },
-        "iceSOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/iceSOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/iceSOL_log_bins.webp"
-        },
-        "Pathfinders SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Pathfinders_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Pathfinders_SOL_log_bins.webp"
-        },      
-        "Helius Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Helius_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Helius_Staked_SOL_log_bins.webp"
-        },
-        "Drift Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Drift_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Drift_Staked_SOL_log_bins.webp"
-        },
-        "Power Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Power_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Power_Staked_SOL_log_bins.webp"
-        },        
-        "Pumpkin's Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Pumpkin's_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Pumpkin's_Staked_SOL_log_bins.webp"
-        },
-        "Lantern Staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Lantern_Staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Lantern_Staked_SOL_log_bins.webp"
-        },
-        "bonkSOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/bonkSOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/bonkSOL_log_bins.webp"
-        },
-        "Overclock SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Overclock_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Overclock_SOL_log_bins.webp"
-        },
-        "SolanaHub staked SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/SolanaHub_staked_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/SolanaHub_staked_SOL_log_bins.webp"
-        },
-        "Solana Compass LST": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Solana_Compass_LST_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Solana_Compass_LST_log_bins.webp"
-        },
-        "Phase Labs SOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Phase_Labs_SOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/Phase_Labs_SOL_log_bins.webp"
-        },
-        "picoSOL": {
-            "pet": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/picoSOL_pet_log_bins.webp",
-            "log": "https://shdw-drive.genesysgo.net/7xLawi47mz65xag7NXvEvkMTqLtdG9dWoSh4sLhf56fc/picoSOL_log_bins.webp"
-        },
-    }
-
-    return templates.TemplateResponse("dashboard.html", {"request": request, "overall_graphs": overall_graphs, "lst_graphs": lst_graphs})
-
-
-
-async def fetch_token_metadata(mint):
-    url = f"https://api.sanctum.so/v1/metadata/{mint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch metadata")
-
-async def fetch_token_prices(mints):
-    # Construct the query string by joining mints with the proper parameter format
-    mints_query = '&'.join(f'input={mint}' for mint in mints)
-    url = f"https://api.sanctum.so/v1/price?{mints_query}"
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code == 200:
-            price_data = response.json().get('prices', [])
-            # Transform the price data into a dictionary, extracting the 'amount' for each 'mint'
-            return {item['mint']: float(item['amount']) for item in price_data if 'mint' in item and 'amount' in item}
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch prices")
+    # Built by the data manager after each push; the figure list comes from the plot manifest
+    response = dashboard_page.response(request)
+    if response is None:
+        raise HTTPException(status_code=503, detail="Dashboard has not been built yet", headers={"Retry-After": "60"})
+    return response
+
+@app.get("/images/{name}")
+async def figure_image(name: str, request: Request, v: str = None):
+    if not FIGURE_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Unknown figure")
+    image = await image_cache.get(name, v)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Unknown figure")
+    entry, body = image
+    etag = f'"{entry["sha256"][:32]}"'
+    # A URL carrying the figure's digest always names these bytes, so browsers may keep it indefinitely
+    immutable = matches_version(entry, v)
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable' if immutable else f'public, max-age={IMAGE_MAX_AGE}'}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='image/webp', headers=headers)
 
 async def fetch_token_data(url: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch data")
-      
-@app.get("/old-dashboard", response_class=HTMLResponse)
-async def show_dashboard(request: Request):
-    url = "https://shdw-drive.genesysgo.net/3UgjUKQ1CAeaecg5CWk88q9jGHg8LJg9MAybp4pevtFz/token_data.json"
-    data = await fetch_token_data(url)
+    response = await upstream.get(url)
+    if response.status_code == 200:
+        # token_data.json runs to many megabytes; parsing it on the loop would stall every request
+        return await asyncio.to_thread(response.json)
+    else:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch data")
+
+def load_snapshot_indexes(directory):
+    # Prefer the holder index written by the process stage; older snapshots only have columns
+    return {mint: load_index(directory, mint) or AmountIndex.from_amounts(snapshot_store.load_amounts(directory, mint))
+            for mint in snapshot_store.available_mints(directory)}
+
+def token_amounts(token_data):
+    if isinstance(token_data, dict):
+        return np.asarray(token_data['amount_normalized'], dtype=float)
+    return np.array([account['amount_normalized'] for account in token_data], dtype=float)
+
+def token_index(token_data):
+    return AmountIndex.from_amounts(token_amounts(token_data))
+
+async def load_dataset():
+    if SNAPSHOT_DIR:
+        return await asyncio.to_thread(load_snapshot_indexes, SNAPSHOT_DIR)
+    data = await fetch_token_data(TOKEN_DATA_URL)
+    # Each token is kept as a sorted holder index, so owners are dropped instead of being held in memory
+    indexes = await asyncio.gather(*(asyncio.to_thread(token_index, token_data) for token_data in data.values()))
+    return dict(zip(data.keys(), indexes))
+
+async def load_metadata():
+    # token_api keeps metadata on disk per mint, so a new token in the dataset costs one request
+    tokens = list((await dataset_cache.get()).keys())
+    metadata_results = await token_api.get_metadata(tokens, upstream, token_api_limiter)
+    missing = [token for token in tokens if not metadata_results[token]]
+    if missing:
+        print(f"No metadata for {', '.join(missing)}; leaving them off the dashboard")
+    return {token: metadata for token, metadata in metadata_results.items() if metadata}
+
+async def load_prices():
+    tokens = list((await dataset_cache.get()).keys())
+    return await token_api.get_prices(tokens, upstream, token_api_limiter)
+
+async def render_dashboard_images():
+    data = await dataset_cache.get()
+    metadata_results = await metadata_cache.get()
+    prices_dict = await prices_cache.get()
+
+    # Background renders wait for a pool slot rather than being rejected
+    tokens = list(metadata_results.keys())
+    renders = await asyncio.gather(*(
+        plot_pet_logarithmic_bins(data, token, metadata_results[token], prices_dict.get(token, 0.0) / 1_000_000_000, wait=True)
+        for token in tokens))
+    return {metadata_results[token]['name']: image_base64 for token, image_base64 in zip(tokens, renders) if image_base64}
+
+async def compute_api_payloads():
+    data = await dataset_cache.get()
+    metadata_results = await metadata_cache.get()
+    prices_dict = await prices_cache.get()
+    # Summaries, the pooled index and serialisation are all CPU-bound, so they stay off the loop
+    return await asyncio.to_thread(build_api_payloads, data, metadata_results, prices_dict)
+
+def build_api_payloads(data, metadata_results, prices_dict):
+    # Every query is a lookup on the token's index; payloads are serialised once per refresh
     tokens = list(data.keys())
+    summaries = [stats.summarize_token(data[token]) for token in tokens]
+
+    payloads = {}
+    token_list = []
+    for token, summary in zip(tokens, summaries):
+        metadata = metadata_results.get(token) or {}
+        token_list.append({
+            'mint': token,
+            'name': metadata.get('name', token),
+            'symbol': metadata.get('symbol', ''),
+            'price': prices_dict.get(token, 0.0) / 1_000_000_000,
+            'holders': summary['statistics']['count'],
+        })
+        payloads[(token, 'stats')] = stats.encode_payload({'mint': token, 'statistics': summary['statistics'],
+                                                           'percentiles': summary['percentiles'],
+                                                           'concentration': summary['concentration']})
+        for kind, histogram in summary['histograms'].items():
+            payloads[(token, 'histogram', kind)] = stats.encode_payload({'mint': token, **histogram})
+    # All holders of every token pooled, for the cross-LST view
+    combined = AmountIndex.merge(list(data.values())) if data else AmountIndex.from_amounts([])
+    summary = stats.summarize_token(combined)
+    payloads[('all', 'stats')] = stats.encode_payload({'mint': 'all', 'statistics': summary['statistics'],
+                                                       'percentiles': summary['percentiles'],
+                                                       'concentration': summary['concentration']})
+    for kind, histogram in summary['histograms'].items():
+        payloads[('all', 'histogram', kind)] = stats.encode_payload({'mint': 'all', **histogram})
+    payloads['indexes'] = {**data, 'all': combined}
+    payloads['tokens'] = stats.encode_payload({'tokens': token_list, 'bins': list(stats.HISTOGRAM_BINS)})
+    return payloads
+
+def etag_matches(request, etag):
+    # If-None-Match may list several tags, and proxies may weaken them to W/"..."
+    tags = [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]
+    return etag in tags or '*' in tags
+
+def cached_json(request, payload):
+    body, etag = payload
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={API_MAX_AGE}'}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+dataset_cache = CachedValue("dataset", load_dataset, DATASET_TTL)
+metadata_cache = CachedValue("metadata", load_metadata, TOKEN_LIST_TTL)
+prices_cache = CachedValue("prices", load_prices, PRICES_TTL)
+figures_cache = CachedValue("figures", render_dashboard_images, FIGURES_TTL)
+stats_cache = CachedValue("stats", compute_api_payloads, STATS_TTL)
+
+@app.get("/api/tokens")
+async def api_tokens(request: Request):
+    return cached_json(request, (await stats_cache.get())['tokens'])
+
+@app.get("/api/tokens/{mint}/stats")
+async def api_token_stats(mint: str, request: Request):
+    payload = (await stats_cache.get()).get((mint, 'stats'))
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Unknown token")
+    return cached_json(request, payload)
+
+@app.get("/api/tokens/{mint}/histogram")
+async def api_token_histogram(mint: str, request: Request, bins: str = 'pet', edges: str = None):
+    payloads = await stats_cache.get()
+    if edges is not None:
+        # Arbitrary layouts are searchsorted lookups on the token's index, so they are answered per request
+        index = payloads['indexes'].get(mint)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Unknown token")
+        bin_edges = stats.parse_edges(edges)
+        if bin_edges is None:
+            raise HTTPException(status_code=400, detail="edges must be 2 to 64 increasing numbers")
+        return cached_json(request, stats.encode_payload({'mint': mint, **stats.histogram(index, bin_edges)}))
+    payload = payloads.get((mint, 'histogram', bins))
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Unknown token or bin layout")
+    return cached_json(request, payload)
+
+@app.get("/api/tokens/{mint}/history")
+async def api_token_history(mint: str, request: Request, start: int = None, end: int = None):
+    if not os.path.exists(timeseries.series_path(TIMESERIES_DIR, mint)):
+        raise HTTPException(status_code=404, detail="Unknown token")
+    # A range is two binary searches over the memory-mapped series, so it is read per request
+    records = timeseries.query(TIMESERIES_DIR, mint, start, end)
+    return cached_json(request, stats.encode_payload({'mint': mint, **timeseries.records_to_json(records)}))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    gauges = [(('render_pool_' + name, ()), value) for name, value in render_pool.metrics().items()]
+    for cache in (dataset_cache, metadata_cache, prices_cache, stats_cache, figures_cache):
+        status = cache.status()
+        gauges.append((('cache_fresh', (('cache', cache.name),)), int(status['fresh'])))
+        if status['age_seconds'] is not None:
+            gauges.append((('cache_age_seconds', (('cache', cache.name),)), status['age_seconds']))
+    return metrics.REGISTRY.prometheus(extra_gauges=gauges)
+
+@app.get("/cache-status")
+async def cache_status():
+    return {**{cache.name: cache.status() for cache in (dataset_cache, metadata_cache, prices_cache, stats_cache, figures_cache)},
+            'images': image_cache.status()}
+
+@app.get("/render-status")
+async def render_status():
+    return render_pool.metrics()
+
+@app.get("/upstream-status")
+async def upstream_status():
+    return upstream.status()
 
-    metadata_tasks = [fetch_token_metadata(token) for token in tokens]
-    metadata_results = await asyncio.gather(*metadata_tasks)
-
-    prices_dict = await fetch_token_prices(tokens)
-    print(prices_dict)
-
-    images = {}
-    for token, metadata in zip(tokens, metadata_results):
-        price = prices_dict.get(token, 0.0) / 1_000_000_000
-        #image_base64 = await plot_logarithmic_bins(data, token, metadata, price)
-        image_base64 = await plot_pet_logarithmic_bins(data, token, metadata, price)
-        if image_base64:
-            images[token] = image_base64
-
-    return templates.TemplateResponse("dashboard.html", {"request": request, "images": images})
-
-
-async def generate_percentile_scatter_plot(data, token_id, metadata):
-    if token_id not in data:
-        return None
-
-    token_data = data[token_id]
-    amounts = np.array([account['amount_normalized'] for account in token_data])
-    sorted_amounts = np.sort(amounts)[::-1]  # Sort amounts in descending order
-
-    # Generating x-values (percentiles) for each point
-    n = len(sorted_amounts)
-    percentiles = np.arange(1, n+1) / n * 100  # Calculate percentiles for each data point
-
-    plt.figure(figsize=(10, 6))
-    plt.scatter(percentiles, sorted_amounts, color='blue', alpha=0.7)
-
-    # Setting logarithmic scale for y-axis
-    plt.yscale('log')
-    plt.ylim(np.min(sorted_amounts[sorted_amounts > 0]), np.max(sorted_amounts))  # Avoid log(0) error by excluding zeros
-
-    # Plot aesthetics
-    plt.title(f"{metadata['name']} ({metadata['symbol']}) Distribution - Log Scale")
-    plt.xlabel("Percentile")
-    plt.ylabel(f"Token Amount ({metadata['symbol']}) [Log Scale]")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
+@app.get("/old-dashboard", response_class=HTMLResponse)
+async def show_old_dashboard(request: Request):
+    # Figures are pre-rendered by the background refresher; only a cold start waits on upstream
+    images = await figures_cache.get()
+    return templates.TemplateResponse(request, "dashboard.html", {"images": images, "overall_graphs": {}, "lst_graphs": {}})
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
 
-async def plot_pet_logarithmic_bins(data, token_id, metadata, price):
-    token_data = data.get(token_id, [])
-    if not token_data:
-        return None
+def positive_index(data, token_id):
+    index = data.get(token_id)
+    return index if index is not None and index.count else None
 
-    amounts = np.array([account['amount_normalized'] for account in token_data if account['amount_normalized'] > 0])
-    if amounts.size == 0:
+async def generate_percentile_scatter_plot(data, token_id, metadata, wait=False):
+    index = positive_index(data, token_id)
+    if index is None:
         return None
+    return await render_pool.submit(figures.render_percentile_scatter_plot, index, metadata, wait=wait)
 
-    bins = [0.1, 0.3, 0.6, 0.9, 1.1, 2, 4, 6, np.inf]
-    bin_labels = ['0.1-0.3','0.3-0.6', '0.6-0.9', '0.9-1.1', '1.1-2', '2-4', '4-6', '6+']
-    counts, _ = np.histogram(amounts, bins=bins)
-    percentages = (counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(counts)
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(bin_labels, percentages, color='green', alpha=0.7)
-    plt.title(f"Distribution of {metadata['name']} ({metadata['symbol']}) - Current Price: {price:.4f} SOL")
-    plt.xlabel("Token Holdings Range")
-    plt.ylabel("Percentage of Holders")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
-
-async def plot_logarithmic_bins(data, token_id, metadata, price):
-    token_data = data.get(token_id, [])
-    if not token_data:
+async def plot_histogram(plot, data, token_id, metadata, price, wait=False):
+    index = positive_index(data, token_id)
+    if index is None:
         return None
+    layout = plot_specs.PLOT_SPECS[plot]['bins']
+    histogram = plot_specs.compute_histograms(index, [layout])[layout]
+    fields = {'name': metadata['name'], 'symbol': metadata['symbol'], 'price': price}
+    return await render_pool.submit(figures.render_histogram, plot, histogram, fields, wait=wait)
 
-    amounts = np.array([account['amount_normalized'] for account in token_data if account['amount_normalized'] > 0])
-    if amounts.size == 0:
-        return None
+async def plot_pet_logarithmic_bins(data, token_id, metadata, price, wait=False):
+    return await plot_histogram('dashboard_pet_bins', data, token_id, metadata, price, wait)
 
-    bins = [0.1, 1, 10, 100, 1000, np.inf]
-    bin_labels = ['0.1-1', '1-10', '10-100', '100-1000', '1000+']
-    counts, _ = np.histogram(amounts, bins=bins)
-    percentages = (counts / counts.sum()) * 100 if counts.sum() > 0 else [0] * len(counts)
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(bin_labels, percentages, color='green', alpha=0.7)
-    plt.title(f"Distribution of {metadata['name']} ({metadata['symbol']}) - Current Price: {price:.4f} SOL")
-    plt.xlabel("Token Holdings Range")
-    plt.ylabel("Percentage of Holders")
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
+async def plot_logarithmic_bins(data, token_id, metadata, price, wait=False):
+    return await plot_histogram('dashboard_log_bins', data, token_id, metadata, price, wait)
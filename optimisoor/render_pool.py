@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+class RenderQueueFull(Exception):
+    pass
+
+class RenderPool:
+    # Runs blocking figure renders in worker processes so the event loop never renders.
+    # At most max_queue renders may be queued or running; past that, request-driven renders are
+    # rejected straight away (backpressure) while background renders wait for a slot.
+    def __init__(self, max_workers=None, max_queue=32):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.executor = None
+        self.slots = None
+        self.outstanding = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.render_seconds = 0.0
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.slots = asyncio.Semaphore(self.max_queue)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def submit(self, fn, *args, wait=False):
+        if self.executor is None:
+            raise RuntimeError("Render pool has not been started")
+        if not wait and self.slots.locked():
+            self.rejected += 1
+            raise RenderQueueFull(f"{self.outstanding} renders already queued")
+        async with self.slots:
+            self.outstanding += 1
+            self.submitted += 1
+            start = time.perf_counter()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.outstanding -= 1
+            self.completed += 1
+            self.render_seconds += time.perf_counter() - start
+            return result
+
+    def metrics(self):
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': min(self.outstanding, self.max_workers),
+            'queue_depth': max(self.outstanding - self.max_workers, 0),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'render_seconds_total': round(self.render_seconds, 3),
+        }
@@ -0,0 +1,79 @@
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.responses import Response
+import dashboard_build
+
+# Best first; a build only has brotli when the build host had the module
+ENCODINGS = ['br', 'gzip']
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        # Proxies may weaken the tag on the way back
+        return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class StaticPage:
+    # Serves the latest page written by dashboard_build. Only build.json is stat'ed per request; its
+    # files are read into memory once per build, and responses carry an ETag and Last-Modified so a
+    # repeat visit is answered with a 304 and no body.
+    def __init__(self, directory):
+        self.directory = directory
+        self.build = None
+        self.build_mtime = None
+        self.variants = {}
+
+    def load(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, dashboard_build.BUILD_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self.build_mtime:
+            build = dashboard_build.read_build(self.directory)
+            variants = {}
+            for encoding, filename in build['files'].items():
+                with open(os.path.join(self.directory, filename), 'rb') as f:
+                    variants[encoding] = f.read()
+            self.build, self.variants, self.build_mtime = build, variants, mtime
+        return self.build
+
+    def response(self, request):
+        build = self.load()
+        if build is None:
+            return None
+        accepted = accepted_encodings(request.headers.get('accept-encoding', ''))
+        encoding = next((name for name in ENCODINGS if name in accepted and name in self.variants), 'identity')
+        # Each encoding is a different body, so each gets its own tag
+        etag = f'"{build["sha256"][:32]}-{encoding}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(build['built_at'], usegmt=True),
+            # Cached copies are always revalidated; an unchanged build costs a 304
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        if not_modified(request, etag, build['built_at']):
+            return Response(status_code=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(content=self.variants[encoding], media_type='text/html', headers=headers)
+
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import numpy as np
+import plot_specs
+
+# Bin layouts served to the browser: the same registry the figures are drawn from
+HISTOGRAM_BINS = plot_specs.BIN_LAYOUTS
+PERCENTILES = [25, 50, 75, 90, 95, 99]
+TOP_HOLDERS = [10, 100]
+MAX_CUSTOM_EDGES = 64
+
+def edge_labels(edges):
+    labels = []
+    for lower, upper in zip(edges[:-1], edges[1:]):
+        labels.append(f"{lower:g}+" if np.isinf(upper) else f"{lower:g}-{upper:g}")
+    return labels
+
+def parse_edges(text):
+    # "0.1,1,10,inf" -> sorted float edges; None when the layout is not usable
+    try:
+        edges = [float(edge) for edge in text.split(',')]
+    except ValueError:
+        return None
+    if not 2 <= len(edges) <= MAX_CUSTOM_EDGES:
+        return None
+    # Only the last edge may be infinite (+inf, an open-ended top bin); inf-inf would otherwise be nan,
+    # which passes the increasing check below
+    if not np.isfinite(edges[:-1]).all() or np.isnan(edges[-1]) or edges[-1] == -np.inf:
+        return None
+    if np.any(np.diff(edges) <= 0):
+        return None
+    return edges
+
+def histogram_payload(kind, histogram):
+    return {
+        'bins': kind,
+        'labels': histogram['labels'],
+        'counts': histogram['counts'].tolist(),
+        'percentages': [round(float(value), 4) for value in histogram['percentages']],
+        'holdings': [round(float(value), 6) for value in histogram['holdings']],
+    }
+
+def histogram(index, edges, labels=None, kind='custom'):
+    counts = index.histogram(edges)
+    total = counts.sum()
+    return histogram_payload(kind, {
+        'labels': labels or edge_labels(edges),
+        'counts': counts,
+        'percentages': counts / total * 100 if total else np.zeros(len(counts)),
+        'holdings': index.bin_sums(edges),
+    })
+
+def summarize_token(index):
+    return {
+        'statistics': index.statistics(),
+        'percentiles': {str(p): float(value) for p, value in zip(PERCENTILES, index.percentile(PERCENTILES))},
+        'concentration': {
+            'gini': index.gini(),
+            'nakamoto': index.nakamoto(),
+            **{f'top_{n}_share': index.top_share(n) for n in TOP_HOLDERS},
+        },
+        'histograms': {kind: histogram_payload(kind, values)
+                       for kind, values in plot_specs.compute_histograms(index, list(HISTOGRAM_BINS)).items()},
+    }
+
+def encode_payload(payload):
+    # Bodies are serialised once when the dataset refreshes; the ETag is a digest of those bytes
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
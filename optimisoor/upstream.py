@@ -0,0 +1,72 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+import httpx
+import metrics
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class UpstreamClient:
+    # One pooled client for the app's lifetime: keep-alive connections (HTTP/2 when h2 is
+    # installed) are reused across requests, and each upstream host gets its own cap on
+    # concurrent requests so a fan-out cannot flood it.
+    def __init__(self, host_limits=None, default_limit=8, timeout=10.0, max_connections=32):
+        self.host_limits = host_limits or {}
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.semaphores = {}
+        self.client = None
+        self.requests = 0
+
+    async def start(self):
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                              keepalive_expiry=60)
+        timeout = httpx.Timeout(self.timeout, connect=5.0)
+        self.client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits, timeout=timeout)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.default_limit))
+        return self.semaphores[host]
+
+    async def request(self, method, url, **kwargs):
+        # Same signature as httpx.AsyncClient.request, so http_client helpers (which record their
+        # own metrics and retries) can be handed this client and still respect the host caps
+        if self.client is None:
+            raise RuntimeError("Upstream client has not been started")
+        async with self.semaphore(url):
+            self.requests += 1
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        if self.client is None:
+            raise RuntimeError("Upstream client has not been started")
+        async with self.semaphore(url):
+            self.requests += 1
+            host = urlparse(url).netloc
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(url, **kwargs)
+            except httpx.HTTPError:
+                metrics.record_upstream_request(host, time.perf_counter() - start, "error", 0)
+                raise
+            metrics.record_upstream_request(host, time.perf_counter() - start, response.status_code, len(response.content))
+            return response
+
+    def status(self):
+        return {
+            'requests': self.requests,
+            'http2': HTTP2_AVAILABLE,
+            'host_limits': {host: self.host_limits.get(host, self.default_limit) for host in self.semaphores},
+        }
@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import holder_snapshots
+import snapshot_store
+
+OWNER_IDS_PATH = "data/owner_ids.npy"
+
+# Base58 addresses are ASCII, so they are kept as fixed-width bytes: a quarter of the size of
+# unicode arrays and much faster to sort and search
+OWNER_DTYPE = 'S44'
+
+class OwnerInterner:
+    # Assigns every base58 owner a stable integer id, kept across runs in OWNER_IDS_PATH. Ids are
+    # positions in the stored owner array, so snapshots from different days can be joined on ints.
+    def __init__(self, owners=None):
+        self.owners = np.asarray(owners if owners is not None else [], dtype=OWNER_DTYPE)
+        self.reindex()
+
+    def reindex(self):
+        self.order = np.argsort(self.owners, kind='stable')
+        self.sorted_owners = self.owners[self.order]
+
+    @classmethod
+    def load(cls, path=OWNER_IDS_PATH):
+        return cls(np.load(path) if os.path.exists(path) else None)
+
+    def save(self, path=OWNER_IDS_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, self.owners)
+        os.replace(f"{path}.tmp", path)
+
+    def __len__(self):
+        return len(self.owners)
+
+    def lookup(self, owners):
+        # Id of each owner, or -1 for owners never interned
+        owners = np.asarray(owners, dtype=OWNER_DTYPE)
+        if not len(self.owners):
+            return np.full(len(owners), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_owners, owners), len(self.owners) - 1)
+        found = self.sorted_owners[positions] == owners
+        return np.where(found, self.order[positions], -1).astype(np.int64)
+
+    def intern(self, owners):
+        owners = np.asarray(owners, dtype=OWNER_DTYPE)
+        ids = self.lookup(owners)
+        missing = ids < 0
+        if missing.any():
+            new_owners, inverse = np.unique(owners[missing], return_inverse=True)
+            ids[missing] = len(self.owners) + inverse
+            self.owners = np.concatenate([self.owners, new_owners])
+            self.reindex()
+        return ids
+
+class Holdings:
+    # One snapshot as (owner id, token) pairs with a balance, sorted by a combined int64 key
+    def __init__(self, tokens, owner_ids, token_index, amounts):
+        self.tokens = list(tokens)
+        keys = np.asarray(owner_ids, dtype=np.int64) * len(self.tokens) + np.asarray(token_index, dtype=np.int64)
+        # Several accounts of one owner for the same token collapse into a single balance
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.amounts = np.bincount(inverse, weights=amounts, minlength=len(self.keys))
+
+    @property
+    def owner_ids(self):
+        return self.keys // len(self.tokens)
+
+    @property
+    def token_index(self):
+        return self.keys % len(self.tokens)
+
+def holdings_from_owner_matrix(matrix, interner):
+    # data_plotter.aggregate_owner_data output, re-keyed on interned owner ids
+    owner_ids = interner.intern(matrix.owners)
+    return Holdings(matrix.tokens, owner_ids[matrix.owner_index], matrix.token_index, matrix.amounts)
+
+def token_holders(directory, mint):
+    # Holder snapshots first (base + deltas), then raw columns for days recorded before snapshots existed
+    if os.path.exists(holder_snapshots.snapshot_path(directory, mint)):
+        holders, decimals, _ = holder_snapshots.load_snapshot(directory, mint)
+        owners = np.array(list(holders), dtype=OWNER_DTYPE)
+        amounts = np.fromiter(holders.values(), dtype=np.float64, count=len(holders)) / float(10 ** (decimals or 0))
+        return owners, amounts
+    if snapshot_store.has_columns(directory, mint):
+        columns = snapshot_store.load_token_columns(directory, mint, min_amount=0)
+        return columns['owner'], columns['amount_normalized']
+    return None
+
+def load_holdings(directory, tokens, interner):
+    owner_parts, token_parts, amount_parts = [], [], []
+    for position, mint in enumerate(tokens):
+        holders = token_holders(directory, mint)
+        if holders is None:
+            continue
+        owners, amounts = holders
+        owner_parts.append(interner.intern(owners))
+        token_parts.append(np.full(len(owners), position, dtype=np.int64))
+        amount_parts.append(amounts)
+    if not owner_parts:
+        return Holdings(tokens, [], [], [])
+    return Holdings(tokens, np.concatenate(owner_parts), np.concatenate(token_parts), np.concatenate(amount_parts))
+
+def compute_flows(before, after, prices=None):
+    # Per owner, balance lost in some tokens and gained in others is treated as a migration and split
+    # proportionally across the token pairs; whatever is not matched left or entered the LST set.
+    # prices (SOL per token) put different tokens on one scale; by default one token counts as one unit.
+    tokens = before.tokens
+    count = len(tokens)
+    scale = np.array([1.0 if prices is None else prices.get(token, 0.0) for token in tokens])
+
+    keys = np.union1d(before.keys, after.keys)
+    previous = np.zeros(len(keys))
+    current = np.zeros(len(keys))
+    previous[np.searchsorted(keys, before.keys)] = before.amounts
+    current[np.searchsorted(keys, after.keys)] = after.amounts
+    owner_ids = keys // count
+    token_index = keys % count
+
+    delta = (current - previous) * scale[token_index]
+    decrease = np.where(delta < 0, -delta, 0.0)
+    increase = np.where(delta > 0, delta, 0.0)
+
+    owners, owner_position = np.unique(owner_ids, return_inverse=True)
+    owner_decrease = np.bincount(owner_position, weights=decrease, minlength=len(owners))
+    owner_increase = np.bincount(owner_position, weights=increase, minlength=len(owners))
+    moved = np.minimum(owner_decrease, owner_increase)
+
+    # Only owners that both reduced and added holdings contribute to the token-to-token matrix
+    migrating = moved > 0
+    row = np.cumsum(migrating) - 1
+    pair_mask = migrating[owner_position]
+    pair_owner = owner_position[pair_mask]
+    outgoing = np.zeros((int(migrating.sum()), count))
+    incoming = np.zeros((int(migrating.sum()), count))
+    outgoing[row[pair_owner], token_index[pair_mask]] = decrease[pair_mask] / owner_decrease[pair_owner] * moved[pair_owner]
+    incoming[row[pair_owner], token_index[pair_mask]] = increase[pair_mask] / owner_increase[pair_owner]
+    flow = outgoing.T @ incoming
+    flow_owners = (outgoing > 0).T.astype(np.int64) @ (incoming > 0).astype(np.int64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unmatched_out = np.where(owner_decrease > 0, 1 - moved / owner_decrease, 0.0)[owner_position]
+        unmatched_in = np.where(owner_increase > 0, 1 - moved / owner_increase, 0.0)[owner_position]
+
+    held_before = np.isin(owners, before.owner_ids)
+    held_after = np.isin(owners, after.owner_ids)
+    new_wallet = ~held_before[owner_position]
+    exited_wallet = ~held_after[owner_position]
+
+    def per_token(weights, mask=None):
+        if mask is not None:
+            return np.bincount(token_index[mask], weights=weights[mask], minlength=count)
+        return np.bincount(token_index, weights=weights, minlength=count)
+
+    return {
+        'tokens': tokens,
+        'flow': flow.tolist(),
+        'flow_owners': flow_owners.tolist(),
+        'inflow': per_token(increase).tolist(),
+        'outflow': per_token(decrease).tolist(),
+        'entered_set': per_token(increase * unmatched_in).tolist(),
+        'left_set': per_token(decrease * unmatched_out).tolist(),
+        'holders_gained': np.bincount(token_index[(previous == 0) & (current > 0)], minlength=count).tolist(),
+        'holders_lost': np.bincount(token_index[(previous > 0) & (current == 0)], minlength=count).tolist(),
+        'new_wallets': {
+            'count': int((~held_before).sum()),
+            'per_token': np.bincount(token_index[new_wallet & (current > 0)], minlength=count).tolist(),
+            'amount': per_token(increase, new_wallet).tolist(),
+        },
+        'exited_wallets': {
+            'count': int((~held_after).sum()),
+            'per_token': np.bincount(token_index[exited_wallet & (previous > 0)], minlength=count).tolist(),
+            'amount': per_token(decrease, exited_wallet).tolist(),
+        },
+    }
+
+def snapshot_flows(before_directory, after_directory, tokens, interner_path=OWNER_IDS_PATH):
+    start = time.perf_counter()
+    interner = OwnerInterner.load(interner_path)
+    before = load_holdings(before_directory, tokens, interner)
+    after = load_holdings(after_directory, tokens, interner)
+    interner.save(interner_path)
+    flows = compute_flows(before, after)
+    print(f"Computed owner flows over {len(interner)} owners in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return flows
+
+if __name__ == "__main__":
+    # python owner_flows.py data/20240601 data/20240608
+    from data_fetcher import TOKENS
+    json.dump(snapshot_flows(sys.argv[1], sys.argv[2], TOKENS), sys.stdout, indent=2)
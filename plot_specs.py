@@ -0,0 +1,106 @@
+import numpy as np
+
+# Bin layouts shared by the plotter, the app's figures and its JSON API
+BIN_LAYOUTS = {
+    'log': {
+        'edges': [0.1, 1, 10, 100, 1000, np.inf],
+        'labels': ['0.1-1', '1-10', '10-100', '100-1000', '1000+'],
+    },
+    # The coarser pet layout drawn by the app's dashboard
+    'pet': {
+        'edges': [0.1, 0.3, 0.6, 0.9, 1.1, 2, 4, 6, np.inf],
+        'labels': ['0.1-0.3', '0.3-0.6', '0.6-0.9', '0.9-1.1', '1.1-2', '2-4', '4-6', '6+'],
+    },
+    # The pet layout of the published per-token and per-owner figures
+    'pet_fine': {
+        'edges': [0.1, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 2, 4, 6, 8, 10, np.inf],
+        'labels': ['0.1-0.3', '0.3-0.5', '0.5-0.7', '0.7-0.9', '0.9-1.0', '1.0-1.1', '1.1-2', '2-4', '4-6', '6-8', '8-10', '10+'],
+    },
+}
+
+TOKEN_TITLE = "Distribution of {name} ({symbol}) - Current Price: {price:.4f} SOL"
+
+# Every histogram chart. 'data' is the distribution that is binned: one token's holder balances
+# ('token') or each owner's balance summed over all tokens ('owner_totals'). Charts without an
+# output file are drawn on demand by the app. Adding a chart here costs no extra pass over the data.
+PLOT_SPECS = {
+    'log_bins': {
+        'data': 'token', 'bins': 'log', 'output': '{name}_log_bins.webp',
+        'title': TOKEN_TITLE, 'xlabel': "Token Holdings Range", 'ylabel': "Percentage of Holders",
+    },
+    'pet_log_bins': {
+        'data': 'token', 'bins': 'pet_fine', 'output': '{name}_pet_log_bins.webp', 'statistics': True,
+        'title': TOKEN_TITLE, 'xlabel': "Token Holdings Range", 'ylabel': "Percentage of Holders",
+    },
+    'total_tokens': {
+        'data': 'owner_totals', 'bins': 'pet_fine', 'output': 'total_tokens_per_owner_distribution.webp',
+        'title': "Distribution of Total Tokens Owned per Owner", 'xlabel': "Total Tokens Owned",
+        'ylabel': "Percentage of Owners (%)",
+    },
+    'total_tokens_cumulative': {
+        'data': 'owner_totals', 'bins': 'pet_fine', 'output': 'cumulative_total_tokens_per_owner_distribution.webp',
+        'cumulative': True, 'title': "Cumulative Distribution of Total Tokens Owned per Owner",
+        'xlabel': "Total Tokens Owned", 'ylabel': "Cumulative Percentage of Owners (%)",
+    },
+    'dashboard_log_bins': {
+        'data': 'token', 'bins': 'log', 'output': None,
+        'title': TOKEN_TITLE, 'xlabel': "Token Holdings Range", 'ylabel': "Percentage of Holders",
+    },
+    'dashboard_pet_bins': {
+        'data': 'token', 'bins': 'pet', 'output': None,
+        'title': TOKEN_TITLE, 'xlabel': "Token Holdings Range", 'ylabel': "Percentage of Holders",
+    },
+}
+
+def layouts_for(data, output_only=False):
+    return sorted({spec['bins'] for spec in PLOT_SPECS.values()
+                   if spec['data'] == data and (spec['output'] or not output_only)})
+
+def compute_histograms(index, layouts):
+    # Counts, holdings and percentages for several layouts of one AmountIndex. The layouts' edges
+    # are merged and located in the sorted amounts with one searchsorted per side; each layout then
+    # reads its own positions, so no layout rescans or re-sorts the balances.
+    edges = np.unique(np.concatenate([np.asarray(BIN_LAYOUTS[name]['edges'], dtype=float) for name in layouts]))
+    left = np.searchsorted(index.amounts, edges, side='left')
+    right = np.searchsorted(index.amounts, edges, side='right')
+    histograms = {}
+    for name in layouts:
+        layout = BIN_LAYOUTS[name]
+        at = np.searchsorted(edges, np.asarray(layout['edges'], dtype=float))
+        # np.histogram bins: half-open except the last, which includes its right edge
+        positions = left[at]
+        positions[-1] = right[at[-1]]
+        counts = np.diff(positions)
+        total = counts.sum()
+        histograms[name] = {
+            'labels': layout['labels'],
+            'counts': counts,
+            'holdings': np.diff(index.prefix[positions]),
+            'percentages': counts / total * 100 if total else np.zeros(len(counts)),
+        }
+    return histograms
+
+def draw_histogram(ax, spec, histogram, fields=None, statistics=None):
+    # Draws one PLOT_SPECS chart on a matplotlib Axes from a compute_histograms result
+    labels = histogram['labels']
+    counts = histogram['counts']
+    if spec.get('cumulative'):
+        total = counts.sum()
+        cumulative = np.cumsum(counts) / total * 100 if total else np.zeros(len(counts))
+        previous = np.concatenate(([0.0], cumulative[:-1]))
+        ax.bar(labels, previous, color='blue', alpha=0.7)
+        delta_bars = ax.bar(labels, cumulative - previous, bottom=previous, color='green', alpha=0.7)
+        for bar, delta in zip(delta_bars, counts):
+            ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + bar.get_y(),
+                    f'+{int(delta)} ({(delta / total * 100 if total else 0):.2f}%)',
+                    ha='center', va='bottom', color='black', fontsize=8)
+    else:
+        ax.bar(labels, histogram['percentages'], color='green', alpha=0.7)
+    ax.set_title(spec['title'].format(**(fields or {})))
+    ax.set_xlabel(spec['xlabel'])
+    ax.set_ylabel(spec['ylabel'])
+    ax.grid(True, which="both", ls="--", linewidth=0.5)
+    if statistics and spec.get('statistics'):
+        stats_text = "\n".join([f"{key}: {val:.2f}" for key, val in statistics.items()])
+        ax.annotate(stats_text, xy=(0.75, 0.95), xycoords='axes fraction', verticalalignment='top',
+                    bbox=dict(boxstyle="round,pad=0.5", fc="yellow", alpha=0.5))
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import metrics
+
+class Stage:
+    # A stage runs on its own cadence (interval, in seconds) and/or whenever the output of one of
+    # the stages it depends on changes. The action returns a JSON-serialisable value describing
+    # its output; dependants re-run when that value differs from what they last consumed.
+    def __init__(self, name, action, interval=None, depends_on=(), retry_delay=300):
+        self.name = name
+        self.action = action
+        self.interval = interval
+        self.depends_on = tuple(depends_on)
+        self.retry_delay = retry_delay
+
+class Scheduler:
+    def __init__(self, stages, state_path, max_workers=4, tick=30, after_run=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.tick = tick
+        # Called with the names of the stages that finished, each time one or more have
+        self.after_run = after_run
+        self.state = self.load_state()
+        # Stages run on one long-lived pool; running maps a stage name to its future
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.running = {}
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def stage_state(self, name):
+        return self.state.setdefault(name, {})
+
+    def next_due(self, stage, now):
+        state = self.stage_state(stage.name)
+        if state.get('failed_at') and state['failed_at'] >= state.get('last_success', 0):
+            return state['failed_at'] + stage.retry_delay
+        if stage.interval is None:
+            return None
+        return state.get('last_success', 0) + stage.interval
+
+    def dependency_inputs(self, stage):
+        return {name: self.stage_state(name).get('output') for name in stage.depends_on}
+
+    def retrying(self, stage, now):
+        # A failed stage waits out its retry delay, even if its inputs have moved on since
+        state = self.stage_state(stage.name)
+        failed = state.get('failed_at') and state['failed_at'] >= state.get('last_success', 0)
+        return bool(failed) and now < state['failed_at'] + stage.retry_delay
+
+    def is_due(self, stage, now):
+        if self.retrying(stage, now):
+            return False
+        if stage.depends_on:
+            # Wait until every dependency has produced something, then run whenever one changes
+            inputs = self.dependency_inputs(stage)
+            if any(self.stage_state(name).get('last_success') is None for name in stage.depends_on):
+                return False
+            if inputs != self.stage_state(stage.name).get('inputs'):
+                return True
+        next_due = self.next_due(stage, now)
+        return next_due is not None and now >= next_due
+
+    def run_stage(self, stage, inputs):
+        # Runs on a worker thread, so it only reports the state change; collect applies it
+        print(f"\n--- Running stage: {stage.name} ---")
+        start = time.perf_counter()
+        try:
+            with metrics.stage(stage.name):
+                output = stage.action()
+        except Exception:
+            traceback.print_exc()
+            print(f"Stage {stage.name} failed after {time.perf_counter() - start:.1f}s")
+            return {'failed_at': time.time()}
+        duration = time.perf_counter() - start
+        print(f"Stage {stage.name} completed in {duration:.1f}s")
+        return {'last_success': time.time(), 'duration': duration, 'output': output, 'inputs': inputs}
+
+    def collect(self):
+        # Applies the results of stages that have finished and returns their names
+        finished = {name for name, future in self.running.items() if future.done()}
+        for name in finished:
+            result = self.running.pop(name).result()
+            state = self.stage_state(name)
+            if 'last_success' in result:
+                state.pop('failed_at', None)
+            state.update(result)
+        if finished:
+            self.save_state()
+        return finished
+
+    def submit_due(self, skip=()):
+        # A stage waits while one of its dependencies is running or due, so it never reads half-written inputs;
+        # stages that do not depend on each other run side by side
+        now = time.time()
+        due = [stage for stage in self.stages.values()
+               if stage.name not in self.running and stage.name not in skip and self.is_due(stage, now)]
+        busy = set(self.running) | {stage.name for stage in due}
+        ready = [stage for stage in due if not any(dep in busy for dep in stage.depends_on)]
+        for stage in ready:
+            self.running[stage.name] = self.pool.submit(self.run_stage, stage, self.dependency_inputs(stage))
+        return ready
+
+    def run_due_stages(self):
+        # Runs everything due, and whatever becomes due as those finish, until nothing is left running
+        ran = set()
+        while True:
+            ran |= self.collect()
+            self.submit_due(skip=ran)
+            if not self.running:
+                if ran and self.after_run:
+                    self.after_run(ran)
+                return ran
+            wait(list(self.running.values()), return_when=FIRST_COMPLETED)
+
+    def seconds_until_next(self):
+        # Only future due times count: a stage already due is either running or waiting on one that is,
+        # and finishing wakes run_forever anyway
+        now = time.time()
+        due_times = [self.next_due(stage, now) for name, stage in self.stages.items() if name not in self.running]
+        due_times = [due for due in due_times if due is not None and due > now]
+        if not due_times:
+            return self.tick
+        return min(min(due_times) - now, self.tick)
+
+    def step(self):
+        finished = self.collect()
+        if finished and self.after_run:
+            self.after_run(finished)
+        return self.submit_due()
+
+    def run_forever(self):
+        # Never blocks on a running stage: a long holders fetch leaves the prices cadence untouched
+        while True:
+            self.step()
+            if self.running:
+                wait(list(self.running.values()), timeout=self.seconds_until_next(), return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(self.seconds_until_next())
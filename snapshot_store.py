@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+# Each mint is stored as a directory of .npy columns so readers can memory-map only what they need:
+#   owner_table.npy  unique owner addresses (dictionary)
+#   owner.npy        int32 index into owner_table per row
+#   amount.npy       uint64 raw token amount per row
+#   meta.json        mint, row count and decimals
+COLUMNS_SUFFIX = "_columns"
+
+def columns_path(directory, mint):
+    return os.path.join(directory, f"{mint}{COLUMNS_SUFFIX}")
+
+def has_columns(directory, mint):
+    return os.path.exists(os.path.join(columns_path(directory, mint), "meta.json"))
+
+def available_mints(directory):
+    if not os.path.isdir(directory):
+        return []
+    mints = [name[:-len(COLUMNS_SUFFIX)] for name in os.listdir(directory) if name.endswith(COLUMNS_SUFFIX)]
+    return sorted(mint for mint in mints if has_columns(directory, mint))
+
+def accounts_to_columns(accounts):
+    owners = []
+    amounts = []
+    decimals = None
+    for account in accounts:
+        info = account['info']
+        owners.append(info['owner'])
+        amounts.append(int(info['tokenAmount']['amount']))
+        decimals = info['tokenAmount']['decimals']
+    return owners, np.array(amounts, dtype=np.uint64), decimals
+
+def write_columns(directory, mint, owners, amounts, decimals):
+    path = columns_path(directory, mint)
+    # Write next to the target and swap in, so a reader never sees half a snapshot
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    if len(owners):
+        owner_table, owner_index = np.unique(np.asarray(owners, dtype=str), return_inverse=True)
+    else:
+        owner_table, owner_index = np.array([], dtype='U44'), np.array([], dtype=np.int32)
+    np.save(os.path.join(tmp_path, "owner_table.npy"), owner_table)
+    np.save(os.path.join(tmp_path, "owner.npy"), owner_index.astype(np.int32))
+    np.save(os.path.join(tmp_path, "amount.npy"), np.asarray(amounts, dtype=np.uint64))
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+        json.dump({'mint': mint, 'rows': len(owner_index), 'decimals': decimals}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+    return path
+
+def write_account_columns(directory, mint, accounts):
+    owners, amounts, decimals = accounts_to_columns(accounts)
+    return write_columns(directory, mint, owners, amounts, decimals)
+
+def read_meta(directory, mint):
+    with open(os.path.join(columns_path(directory, mint), "meta.json"), 'r') as f:
+        return json.load(f)
+
+def read_column(directory, mint, column, mmap=True):
+    return np.load(os.path.join(columns_path(directory, mint), f"{column}.npy"), mmap_mode='r' if mmap else None)
+
+def load_amounts(directory, mint, mmap=True):
+    decimals = read_meta(directory, mint)['decimals'] or 0
+    return read_column(directory, mint, "amount", mmap) / float(10 ** decimals)
+
+def load_owners(directory, mint, mmap=True):
+    return read_column(directory, mint, "owner_table", mmap)[read_column(directory, mint, "owner", mmap)]
+
+def load_token_columns(directory, mint, min_amount=0.01):
+    amounts = load_amounts(directory, mint)
+    keep = amounts > min_amount
+    return {'owner': load_owners(directory, mint)[keep], 'amount_normalized': amounts[keep]}
+
+def convert_archive(root="data", remove_json=False):
+    converted = 0
+    for date in sorted(os.listdir(root)):
+        directory = os.path.join(root, date)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith("_accounts.json"):
+                continue
+            mint = filename[:-len("_accounts.json")]
+            json_path = os.path.join(directory, filename)
+            if not has_columns(directory, mint):
+                with open(json_path, 'r') as f:
+                    write_account_columns(directory, mint, json.load(f))
+                converted += 1
+                print(f"Converted {json_path}")
+            if remove_json:
+                os.remove(json_path)
+    print(f"Converted {converted} holder files under {root}")
+    return converted
+
+if __name__ == "__main__":
+    # python snapshot_store.py [data_root] [--remove-json]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    convert_archive(args[0] if args else "data", remove_json="--remove-json" in sys.argv)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The pipeline modules live at the top level and the app's modules under optimisoor/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "optimisoor"))
@@ -0,0 +1,77 @@
+import io
+import os
+import json
+import numpy as np
+import pytest
+import data_fetcher
+import snapshot_store
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+@pytest.mark.parametrize("text", [
+    '[1.5,2]',
+    '[1e5, 2E-3, -0.25]',
+    '[ {"a": 1.5}, "x", [1, 2], true, null, 3 ]',
+    '[12345678901234567890]',
+    '[]',
+])
+def test_iter_json_array_across_chunk_sizes(text, chunk_size):
+    assert list(data_fetcher.iter_json_array(io.StringIO(text), chunk_size)) == json.loads(text)
+
+@pytest.mark.parametrize("text", ['[1,2', '{"a": 1}', '[1.]'])
+def test_iter_json_array_rejects_invalid_input(text):
+    with pytest.raises(ValueError):
+        list(data_fetcher.iter_json_array(io.StringIO(text), 2))
+
+def test_dust_only_block_keeps_token_data_valid(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = 3 * data_fetcher.PROCESS_CHUNK_ROWS
+    owners = [f"owner{index}" for index in range(rows)]
+    amounts = np.full(rows, 5_000_000, dtype=np.uint64)
+    # The middle block is entirely at or below the dust threshold
+    amounts[data_fetcher.PROCESS_CHUNK_ROWS:2 * data_fetcher.PROCESS_CHUNK_ROWS] = 1000
+    snapshot_store.write_columns(".", "Mint1", owners, amounts, 6)
+    snapshot_store.write_columns(".", "Mint2", owners[:10], np.full(10, 1000, dtype=np.uint64), 6)
+
+    data_fetcher.load_and_process_json_files(["Mint1", "Mint2"])
+
+    with open("token_data.json") as f:
+        data = json.load(f)
+    assert len(data["Mint1"]) == 2 * data_fetcher.PROCESS_CHUNK_ROWS
+    assert data["Mint2"] == []
+
+MINTS = ["MintA", "MintB", "MintC"]
+
+async def fake_metadata(mints, *args, **kwargs):
+    # MintC has no metadata and is skipped without counting as a failure
+    return {mint: {'name': mint, 'symbol': mint} if mint != "MintC" else None for mint in mints}
+
+async def fake_fetch_holders(client, limiter, mint, page_semaphore, checkpoint_dir=None):
+    if mint == "MintB":
+        return None
+    return "solanafm", ([f"owner{i}" for i in range(5)], np.full(5, 10 ** 9, dtype=np.uint64), 6)
+
+@pytest.fixture
+def failing_fetch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_fetcher.token_api, "get_metadata", fake_metadata)
+    monkeypatch.setattr(data_fetcher.holder_sources, "fetch_holders", fake_fetch_holders)
+    # Columns left over from an earlier cycle must not stand in for a failed fetch
+    snapshot_store.write_columns(".", "MintB", ["old"], np.full(1, 10 ** 9, dtype=np.uint64), 6)
+
+def test_run_fetcher_reports_failed_mints_and_keeps_the_rest(failing_fetch):
+    assert data_fetcher.run_fetcher(MINTS) == ["MintB"]
+    with open("token_data.json") as f:
+        assert list(json.load(f)) == ["MintA", "MintC"]
+
+def test_holders_stage_archives_completed_mints_before_failing(failing_fetch, monkeypatch):
+    import data_manager
+    import timeseries
+    monkeypatch.setattr(data_manager, "TOKENS", MINTS)
+    with pytest.raises(RuntimeError, match="MintB"):
+        data_manager.fetch_holders_stage()
+    directory = data_manager.create_dated_directory()
+    assert os.path.exists(os.path.join(directory, "holder_churn.json"))
+    with open(os.path.join(directory, "holder_churn.json")) as f:
+        assert list(json.load(f)) == ["MintA"]
+    assert len(timeseries.read_series(timeseries.TIMESERIES_DIR, "MintA")) == 1
+    assert not os.path.exists(timeseries.series_path(timeseries.TIMESERIES_DIR, "MintB"))
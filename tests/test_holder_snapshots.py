@@ -0,0 +1,57 @@
+import json
+import os
+import numpy as np
+import pytest
+import data_manager
+import holder_snapshots
+import snapshot_store
+import timeseries
+
+MINT = "Mint1"
+
+def holders_by_day():
+    holders = {f"owner{i}": (i + 1) * 10 ** 6 for i in range(20)}
+    days = []
+    for day in range(5):
+        holders = dict(holders)
+        holders.pop(f"owner{day}", None)
+        holders[f"new{day}"] = 5 * 10 ** 6
+        holders["owner19"] += 10 ** 6
+        days.append((f"2024060{day + 1}", holders))
+    return days
+
+def test_delta_chain_replays_every_day(tmp_path, monkeypatch):
+    monkeypatch.setattr(holder_snapshots, "MAX_DELTA_CHAIN", 2)
+    days = holders_by_day()
+    for date, holders in days:
+        (tmp_path / date).mkdir()
+        holder_snapshots.write_snapshot(str(tmp_path / date), MINT, holders, 6)
+
+    kinds = [holder_snapshots.read_snapshot_record(str(tmp_path / date), MINT)['kind'] for date, _ in days]
+    # A fresh base once the chain reaches MAX_DELTA_CHAIN deltas
+    assert kinds == ['base', 'delta', 'delta', 'base', 'delta']
+    for date, holders in days:
+        directory = str(tmp_path / date)
+        assert snapshot_store.has_columns(directory, MINT) == (holder_snapshots.read_snapshot_record(directory, MINT)['kind'] == 'base')
+        replayed, decimals, _ = holder_snapshots.load_snapshot(directory, MINT)
+        assert replayed == holders
+        assert decimals == 6
+
+def test_incremental_archive_keeps_only_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    days = holders_by_day()[:2]
+    for date, holders in days:
+        directory = os.path.join("data", date)
+        os.makedirs(directory)
+        for name in ("token_data.json", f"{MINT}_index.npz"):
+            with open(name, 'w') as f:
+                f.write("{}")
+        holder_snapshots.write_snapshot(directory, MINT, holders, 6)
+        data_manager.move_data_to_directory(directory, keep_raw_accounts=False)
+        assert sorted(os.listdir(directory)) == sorted([f"{MINT}_holders.json"] + ([f"{MINT}_columns"] if date == days[0][0] else []))
+
+    # The delta day's time-series point comes from replaying the chain
+    records = timeseries.directory_records(os.path.join("data", days[1][0]), [MINT])
+    expected = np.array(sorted(days[1][1].values())) / 10 ** 6
+    assert records[MINT]['holders'] == len(expected)
+    assert records[MINT]['supply'] == pytest.approx(expected.sum())
@@ -0,0 +1,71 @@
+import asyncio
+import numpy as np
+import pytest
+import benchmark
+import holder_sources
+from http_client import HostRateLimiter, create_client
+
+ACCOUNTS = [2500, 1200]
+
+@pytest.fixture(scope="module")
+def server():
+    # The benchmark's mock server stands in for SolanaFM and the Helius JSON-RPC endpoint
+    tokens = benchmark.generate_tokens(ACCOUNTS, seed=3)
+    with benchmark.MockApiServer(tokens) as server:
+        server.tokens = tokens
+        yield server
+
+@pytest.fixture
+def sources(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(holder_sources, "CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(holder_sources, "SOLANA_FM_URL", server.url)
+    monkeypatch.setattr(holder_sources, "HELIUS_RPC_URL", f"{server.url}/rpc")
+    # Small pages so both sources walk several pages and cursors
+    monkeypatch.setattr(holder_sources, "PAGE_SIZE", 500)
+    monkeypatch.setattr(holder_sources, "HELIUS_PAGE_LIMIT", 400)
+    return holder_sources
+
+def fetch(server, monkeypatch, mint, source_names):
+    monkeypatch.setattr(holder_sources, "HOLDER_SOURCES", source_names)
+
+    async def run():
+        limiter = HostRateLimiter({server.host: (10000, 10000)})
+        async with create_client() as client:
+            return await holder_sources.fetch_holders(client, limiter, mint, asyncio.Semaphore(4))
+    return asyncio.run(run())
+
+def test_helius_and_solanafm_return_identical_columns(server, sources, monkeypatch):
+    for mint, token in server.tokens.items():
+        helius_name, helius = fetch(server, monkeypatch, mint, ["helius"])
+        solanafm_name, solanafm = fetch(server, monkeypatch, mint, ["solanafm"])
+        assert (helius_name, solanafm_name) == ("helius", "solanafm")
+        assert helius[0] == solanafm[0] == [owner.decode() for owner in token.owners]
+        assert np.array_equal(helius[1], solanafm[1])
+        assert np.array_equal(helius[1], token.amounts)
+        assert helius[2] == solanafm[2] == token.decimals
+
+def test_failing_helius_falls_back_to_solanafm(server, sources, monkeypatch):
+    # The mock answers 404 outside /rpc, so every Helius call fails
+    monkeypatch.setattr(holder_sources, "HELIUS_RPC_URL", f"{server.url}/missing")
+    mint, token = next(iter(server.tokens.items()))
+    name, columns = fetch(server, monkeypatch, mint, ["helius", "solanafm"])
+    assert name == "solanafm"
+    assert np.array_equal(columns[1], token.amounts)
+
+def test_no_source_available_returns_none(server, sources, monkeypatch):
+    monkeypatch.setattr(holder_sources, "HELIUS_RPC_URL", f"{server.url}/missing")
+    mint = next(iter(server.tokens))
+    assert fetch(server, monkeypatch, mint, ["helius"]) is None
+
+def test_completed_checkpoint_outlives_page_expiry_until_cleared(sources, monkeypatch):
+    checkpoint = holder_sources.PageCheckpoint("Mint1", holder_sources.checkpoint_root("solanafm"))
+    checkpoint.start(10, 5, 2)
+    checkpoint.mark_complete()
+    # Started and finished before an unfinished checkpoint would have been discarded
+    checkpoint.state['started'] -= 4 * 3600
+    checkpoint.state['completed'] -= 4 * 3600
+    checkpoint.save_state()
+    assert holder_sources.recently_fetched("Mint1")
+
+    holder_sources.clear_completed(["Mint1"])
+    assert not holder_sources.recently_fetched("Mint1")
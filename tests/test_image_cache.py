@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+import benchmark
+from image_cache import ImageCache, OriginUnavailable
+from upstream import UpstreamClient
+
+# Nothing listens on the discard port, so requests to it fail straight away
+DEAD_ORIGIN = "http://127.0.0.1:9/"
+
+@pytest.fixture
+def origin(tmp_path):
+    # The benchmark's mock server stands in for shdw-drive, serving figures with ETags
+    figures = tmp_path / "figures"
+    figures.mkdir()
+    for name in ("a", "b", "c"):
+        (figures / f"{name}.webp").write_bytes(name.encode() * 100)
+    server = benchmark.MockApiServer({}, figures_dir=str(figures))
+    with server:
+        server.figures = figures
+        yield server
+
+def run(cache_dir, origin_url, max_bytes, ttl, steps):
+    # Runs steps(cache) with a started upstream client and returns its result
+    async def main():
+        upstream = UpstreamClient()
+        await upstream.start()
+        try:
+            return await steps(ImageCache(str(cache_dir), origin_url, upstream, max_bytes, ttl))
+        finally:
+            await upstream.close()
+    return asyncio.run(main())
+
+def test_evicts_least_recently_used_by_size(origin, tmp_path):
+    async def steps(cache):
+        for name in ("a.webp", "b.webp", "a.webp", "c.webp"):
+            await cache.get(name)
+        return list(cache.entries), cache.total_bytes
+
+    entries, total = run(tmp_path / "cache", f"{origin.url}/figures/", 250, 60, steps)
+    assert entries == ["a.webp", "c.webp"]
+    assert total == 200
+    assert not (tmp_path / "cache" / "b.webp").exists()
+
+def test_revalidates_with_etag_and_picks_up_changes(origin, tmp_path):
+    async def steps(cache):
+        first = await cache.get("a.webp")
+        second = await cache.get("a.webp")
+        (origin.figures / "a.webp").write_bytes(b"new" * 10)
+        third = await cache.get("a.webp")
+        return first[1], second[1], third[1]
+
+    first, second, third = run(tmp_path / "cache", f"{origin.url}/figures/", 1 << 20, 0, steps)
+    assert first == second == b"a" * 100
+    assert third == b"new" * 10
+    origin.__exit__(None, None, None)
+    assert origin.request_counts == {'figure': 2, 'figure_not_modified': 1}
+
+def test_serves_stale_copy_while_origin_is_down(origin, tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    async def fill(cache):
+        return (await cache.get("a.webp"))[1]
+
+    async def stale(cache):
+        return (await cache.get("a.webp"))[1]
+
+    body = run(cache_dir, f"{origin.url}/figures/", 1 << 20, 0, fill)
+    assert run(cache_dir, DEAD_ORIGIN, 1 << 20, 0, stale) == body
+
+def test_missing_figure_and_unreachable_origin(origin, tmp_path):
+    async def missing(cache):
+        return await cache.get("nothere.webp")
+
+    async def unreachable(cache):
+        with pytest.raises(OriginUnavailable):
+            await cache.get("a.webp")
+        return True
+
+    assert run(tmp_path / "cache", f"{origin.url}/figures/", 1 << 20, 60, missing) is None
+    assert run(tmp_path / "empty", DEAD_ORIGIN, 1 << 20, 60, unreachable)
+
+@pytest.fixture
+def app(origin, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    # Keeps the background refresher off the network
+    monkeypatch.setattr(main, "SNAPSHOT_DIR", str(tmp_path))
+    with TestClient(main.app) as client:
+        monkeypatch.setattr(main, "image_cache", ImageCache(str(tmp_path / "cache"), f"{origin.url}/figures/",
+                                                            main.upstream, 1 << 20, 60))
+        yield main, client
+
+def test_image_route_cache_headers(app):
+    main, client = app
+    response = client.get("/images/a.webp")
+    assert response.status_code == 200
+    assert response.headers['content-type'] == "image/webp"
+    assert response.headers['cache-control'] == f"public, max-age={main.IMAGE_MAX_AGE}"
+    digest = main.image_cache.entries["a.webp"]['sha256']
+
+    assert "immutable" in client.get(f"/images/a.webp?v={digest[:12]}").headers['cache-control']
+    for version in ("", digest[:3]):
+        assert "immutable" not in client.get(f"/images/a.webp?v={version}").headers['cache-control']
+    assert client.get("/images/a.webp", headers={'If-None-Match': response.headers['etag']}).status_code == 304
+    assert client.get("/images/..%2Fsecret.webp").status_code == 404
+    assert client.get("/images/nothere.webp").status_code == 404
+
+def test_image_route_returns_502_without_origin(app, tmp_path, monkeypatch):
+    main, client = app
+    monkeypatch.setattr(main, "image_cache", ImageCache(str(tmp_path / "empty"), DEAD_ORIGIN, main.upstream, 1 << 20, 60))
+    response = client.get("/images/a.webp")
+    assert response.status_code == 502
+    assert response.headers['retry-after'] == "30"
+
+def test_cache_directory_is_created_by_the_first_write(origin, tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    async def steps(cache):
+        assert not cache_dir.exists()
+        await cache.get("a.webp")
+        return cache.read("a.webp")
+
+    assert run(cache_dir, f"{origin.url}/figures/", 1000, 60, steps) == b"a" * 100
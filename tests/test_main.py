@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import main
+import snapshot_store
+import timeseries
+
+MINT = "Mint1"
+
+async def fake_metadata(mints, *args, **kwargs):
+    return {mint: {'name': f"Token {mint}", 'symbol': mint[:4]} for mint in mints}
+
+async def fake_prices(mints, *args, **kwargs):
+    return {mint: 1_000_000_000 for mint in mints}
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # A local snapshot and stubbed token_api keep the app and its background refresher off the network
+    snapshot_dir = tmp_path / "20240601"
+    snapshot_store.write_columns(str(snapshot_dir), MINT, [f"owner{i}" for i in range(50)],
+                                 np.arange(1, 51, dtype=np.uint64) * 10 ** 9, 9)
+    timeseries.record_directory(str(snapshot_dir), root=str(tmp_path / "timeseries"))
+    monkeypatch.setattr(main, "SNAPSHOT_DIR", str(snapshot_dir))
+    monkeypatch.setattr(main, "TIMESERIES_DIR", str(tmp_path / "timeseries"))
+    monkeypatch.setattr(main.token_api, "get_metadata", fake_metadata)
+    monkeypatch.setattr(main.token_api, "get_prices", fake_prices)
+    for cache in (main.dataset_cache, main.metadata_cache, main.prices_cache, main.stats_cache, main.figures_cache):
+        monkeypatch.setattr(cache, "loaded_at", None)
+        monkeypatch.setattr(cache, "refreshing", None)
+    with TestClient(main.app) as client:
+        yield client
+
+def test_old_dashboard_renders(client):
+    response = client.get("/old-dashboard")
+    assert response.status_code == 200
+    assert "Token Distribution Dashboard" in response.text
+    assert '<img src="data:image/png;base64,' in response.text
+    assert f"Plot for Token {MINT}" in response.text
+
+@pytest.mark.parametrize("header", ['{etag}', 'W/{etag}', '"other", {etag}', '"other",W/{etag}', '*'])
+def test_cached_json_revalidates_weak_and_listed_etags(client, header):
+    path = f"/api/tokens/{MINT}/history"
+    etag = client.get(path).headers['etag']
+    assert client.get(path, headers={'If-None-Match': header.format(etag=etag)}).status_code == 304
+
+def test_cached_json_returns_body_for_other_etags(client):
+    response = client.get(f"/api/tokens/{MINT}/history", headers={'If-None-Match': '"other", W/"stale"'})
+    assert response.status_code == 200
+    assert response.json()['dates'] == [20240601]
+
+@pytest.mark.parametrize("path", ["stats", "histogram", "history"])
+def test_unknown_mint_is_not_found(client, path):
+    assert client.get(f"/api/tokens/Unknown/{path}").status_code == 404
@@ -0,0 +1,25 @@
+import asyncio
+import os
+import benchmark
+import fetch_and_plot_oneshot
+import holder_sources
+import token_api
+
+def test_oneshot_leaves_shared_checkpoints_and_columns_alone(tmp_path, monkeypatch):
+    tokens = benchmark.generate_tokens([800, 300], seed=5)
+    monkeypatch.chdir(tmp_path)
+    with benchmark.MockApiServer(tokens) as server:
+        monkeypatch.setattr(holder_sources, "SOLANA_FM_URL", server.url)
+        monkeypatch.setattr(holder_sources, "HELIUS_RPC_URL", f"{server.url}/rpc")
+        monkeypatch.setattr(holder_sources, "PAGE_SIZE", 500)
+        monkeypatch.setattr(token_api, "SANCTUM_URL", server.url)
+        monkeypatch.setattr(token_api, "CACHE_DIR", str(tmp_path / "token_api_cache"))
+        asyncio.run(fetch_and_plot_oneshot.run_pipeline(list(tokens)))
+
+    files = set(os.listdir(tmp_path))
+    assert not any(name.endswith("_columns") for name in files)
+    assert ".checkpoints" not in files
+    figures = {f"{token.symbol}_distribution.png" for token in tokens.values()}
+    # One figure per token, not one overwritten by the next
+    assert len(figures) == len(tokens)
+    assert figures <= files
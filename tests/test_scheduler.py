@@ -0,0 +1,81 @@
+import threading
+from scheduler import Scheduler, Stage
+
+def build(tmp_path, plot_action):
+    runs = {'holders': 0, 'plots': 0}
+
+    def holders():
+        runs['holders'] += 1
+        return "digest"
+
+    def plots():
+        runs['plots'] += 1
+        return plot_action()
+
+    stages = [
+        Stage("holders", holders, interval=3600),
+        Stage("plots", plots, depends_on=("holders",), retry_delay=300),
+    ]
+    return Scheduler(stages, str(tmp_path / "state.json")), runs
+
+def fail():
+    raise RuntimeError("plot failed")
+
+def test_failed_dependent_stage_waits_for_retry_delay(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("scheduler.time.time", lambda: now[0])
+    scheduler, runs = build(tmp_path, fail)
+
+    for _ in range(3):
+        scheduler.run_due_stages()
+        now[0] += 30
+    assert runs == {'holders': 1, 'plots': 1}
+
+    now[0] += 300
+    scheduler.run_due_stages()
+    assert runs['plots'] == 2
+
+def test_dependent_stage_runs_when_inputs_change(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("scheduler.time.time", lambda: now[0])
+    scheduler, runs = build(tmp_path, lambda: "figures")
+
+    scheduler.run_due_stages()
+    scheduler.run_due_stages()
+    assert runs == {'holders': 1, 'plots': 1}
+
+    scheduler.stages["holders"].action = lambda: "new digest"
+    now[0] += 3600
+    scheduler.run_due_stages()
+    assert runs['plots'] == 2
+
+def test_long_stage_does_not_hold_up_an_independent_one(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("scheduler.time.time", lambda: now[0])
+    release = threading.Event()
+    runs = {'holders': 0, 'prices': 0}
+
+    def holders():
+        runs['holders'] += 1
+        release.wait(10)
+        return "digest"
+
+    def prices():
+        runs['prices'] += 1
+        return "prices"
+
+    stages = [Stage("holders", holders, interval=3600), Stage("prices", prices, interval=300),
+              Stage("plots", lambda: "figures", depends_on=("holders", "prices"))]
+    scheduler = Scheduler(stages, str(tmp_path / "state.json"))
+    try:
+        for _ in range(3):
+            scheduler.step()
+            scheduler.running["prices"].result(timeout=10)
+            now[0] += 300
+        # Prices kept its cadence while holders was still running, and plots waited for holders
+        assert runs == {'holders': 1, 'prices': 3}
+        assert "plots" not in scheduler.running
+    finally:
+        release.set()
+    scheduler.run_due_stages()
+    assert scheduler.stage_state("plots")['inputs'] == {'holders': "digest", 'prices': "prices"}
@@ -0,0 +1,16 @@
+import pytest
+import stats
+
+@pytest.mark.parametrize("text, expected", [
+    ("0.1,1,10,inf", [0.1, 1.0, 10.0, float('inf')]),
+    ("0,5", [0.0, 5.0]),
+])
+def test_parse_edges_accepts_increasing_layouts(text, expected):
+    assert stats.parse_edges(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "inf,inf", "1,inf,inf", "nan,1", "1,nan", "-inf,1", "1,-inf", "inf,1",
+    "1", "2,1", "1,1", "a,b", ",".join(str(value) for value in range(stats.MAX_CUSTOM_EDGES + 1)),
+])
+def test_parse_edges_rejects_unusable_layouts(text):
+    assert stats.parse_edges(text) is None
@@ -0,0 +1,46 @@
+import os
+import sys
+import uploader
+
+# Logs every call; "broken" files always fail, "flaky" ones fail their first attempt
+STUB = """
+import os, sys
+path, url, log = sys.argv[1:4]
+with open(log, 'a') as f:
+    f.write(os.path.basename(path) + '\\n')
+if 'broken' in path:
+    sys.exit('upload refused')
+if 'flaky' in path and not os.path.exists(path + '.seen'):
+    open(path + '.seen', 'w').close()
+    sys.exit('connection reset')
+"""
+
+def calls(log):
+    with open(log) as f:
+        return sorted(f.read().split())
+
+def test_upload_directory_retries_reports_failures_and_skips_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploader, "BACKOFF_SECONDS", 0)
+    directory = tmp_path / "figures"
+    directory.mkdir()
+    for name in ("a.webp", "flaky.webp", "broken.webp"):
+        (directory / name).write_bytes(name.encode())
+    (directory / "notes.txt").write_text("not a figure")
+    log = str(tmp_path / "calls.log")
+    stub = uploader.CommandUploader([sys.executable, "-c", STUB, "{file}", "{url}", log])
+
+    uploaded, failed = uploader.upload_directory(str(directory), "https://drive/", stub)
+    assert sorted(uploaded) == ["a.webp", "flaky.webp"]
+    assert failed == ["broken.webp"]
+    assert calls(log) == ["a.webp"] + ["broken.webp"] * uploader.MAX_ATTEMPTS + ["flaky.webp"] * 2
+    manifest = uploader.read_manifest(str(directory))
+    assert manifest == {name: uploader.file_digest(str(directory / name)) for name in ("a.webp", "flaky.webp")}
+
+    # Only the failed file and the one that changed are sent again
+    os.remove(log)
+    (directory / "a.webp").write_bytes(b"changed")
+    uploaded, failed = uploader.upload_directory(str(directory), "https://drive/", stub)
+    assert uploaded == ["a.webp"]
+    assert failed == ["broken.webp"]
+    assert calls(log) == ["a.webp"] + ["broken.webp"] * uploader.MAX_ATTEMPTS
+    assert uploader.read_manifest(str(directory))["a.webp"] == uploader.file_digest(str(directory / "a.webp"))
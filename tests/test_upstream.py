@@ -0,0 +1,37 @@
+import asyncio
+import benchmark
+import token_api
+from http_client import HostRateLimiter
+from upstream import UpstreamClient
+
+def test_token_api_requests_respect_the_host_cap(tmp_path, monkeypatch):
+    tokens = benchmark.generate_tokens([10, 10, 10, 10], seed=2)
+    monkeypatch.setattr(token_api, "CACHE_DIR", str(tmp_path))
+
+    async def main(url, host):
+        upstream = UpstreamClient(host_limits={host: 2})
+        await upstream.start()
+        in_flight = [0, 0]
+        send = upstream.client.request
+
+        async def counting_request(*args, **kwargs):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            try:
+                await asyncio.sleep(0.05)
+                return await send(*args, **kwargs)
+            finally:
+                in_flight[0] -= 1
+        upstream.client.request = counting_request
+        try:
+            metadata = await token_api.get_metadata(list(tokens), upstream, HostRateLimiter({host: (1000, 1000)}))
+        finally:
+            await upstream.close()
+        return metadata, in_flight[1], upstream.requests
+
+    with benchmark.MockApiServer(tokens) as server:
+        monkeypatch.setattr(token_api, "SANCTUM_URL", server.url)
+        metadata, peak, requests = asyncio.run(main(server.url, server.host))
+    assert all(metadata[mint]['symbol'] == token.symbol for mint, token in tokens.items())
+    assert peak == 2
+    assert requests == len(tokens)
@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import snapshot_store
+import holder_snapshots
+from holder_index import AmountIndex, load_index
+
+TIMESERIES_DIR = "data/timeseries"
+LAYOUT_FILE = "layout.json"
+
+# The record layout is fixed on disk; changing any of these needs a new store (or a backfill into one)
+BUCKET_EDGES = [0.01, 0.1, 1, 10, 100, 1000, 10000, np.inf]
+PERCENTILES = [25, 50, 75, 90, 95, 99]
+MIN_AMOUNT = 0.01
+
+RECORD_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('holders', '<i8'),
+    ('supply', '<f8'),
+    ('price', '<f8'),
+    ('gini', '<f8'),
+    ('nakamoto', '<i8'),
+    ('top_10_share', '<f8'),
+    ('percentiles', '<f8', (len(PERCENTILES),)),
+    ('buckets', '<i8', (len(BUCKET_EDGES) - 1,)),
+])
+
+def layout():
+    return {'dtype': RECORD_DTYPE.descr, 'bucket_edges': [str(edge) for edge in BUCKET_EDGES], 'percentiles': PERCENTILES}
+
+def series_path(root, mint):
+    return os.path.join(root, f"{mint}.bin")
+
+def check_layout(root):
+    # Refuses to append records of one layout to a store written with another
+    path = os.path.join(root, LAYOUT_FILE)
+    expected = json.loads(json.dumps(layout()))
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if json.load(f) != expected:
+                raise ValueError(f"{root} was written with a different record layout")
+        return
+    os.makedirs(root, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(expected, f, indent=2)
+
+def build_record(date, index, price=np.nan):
+    record = np.zeros(1, dtype=RECORD_DTYPE)[0]
+    record['date'] = int(date)
+    record['holders'] = index.count
+    record['supply'] = index.total
+    record['price'] = price
+    record['gini'] = index.gini()
+    record['nakamoto'] = index.nakamoto()
+    record['top_10_share'] = index.top_share(10)
+    record['percentiles'] = index.percentile(PERCENTILES)
+    record['buckets'] = index.histogram(BUCKET_EDGES)
+    return record
+
+def read_series(root, mint):
+    path = series_path(root, mint)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+
+def write_records(root, mint, records):
+    # Records for a new latest day are appended; anything older (a backfill) rewrites the file in date order
+    check_layout(root)
+    records = np.sort(np.asarray(records, dtype=RECORD_DTYPE), order='date')
+    existing = read_series(root, mint)
+    path = series_path(root, mint)
+    if len(existing) == 0 or records['date'][0] > existing['date'][-1]:
+        with open(path, 'ab') as f:
+            f.write(records.tobytes())
+        return
+    # Later records win when a day is written twice
+    merged = np.concatenate([records, np.array(existing)])
+    _, first = np.unique(merged['date'], return_index=True)
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(merged[first].tobytes())
+    del existing
+    os.replace(f"{path}.tmp", path)
+
+def query(root, mint, start=None, end=None):
+    # Dates are stored sorted, so a range is two binary searches over the memory-mapped file
+    series = read_series(root, mint)
+    dates = series['date']
+    lower = 0 if start is None else np.searchsorted(dates, int(start), side='left')
+    upper = len(series) if end is None else np.searchsorted(dates, int(end), side='right')
+    return np.array(series[lower:upper])
+
+def records_to_json(records):
+    return {
+        'dates': records['date'].tolist(),
+        'holders': records['holders'].tolist(),
+        'supply': records['supply'].tolist(),
+        'price': [None if np.isnan(price) else price for price in records['price'].tolist()],
+        'gini': records['gini'].tolist(),
+        'nakamoto': records['nakamoto'].tolist(),
+        'top_10_share': records['top_10_share'].tolist(),
+        'percentiles': {str(p): records['percentiles'][:, i].tolist() for i, p in enumerate(PERCENTILES)},
+        'bucket_edges': [str(edge) for edge in BUCKET_EDGES],
+        'buckets': records['buckets'].tolist(),
+    }
+
+def load_directory_prices(directory):
+    path = os.path.join(directory, "token_prices.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def directory_indexes(directory, tokens=None):
+    # Newest layout first: holder index, then columns, then a delta snapshot, then the archived token_data.json
+    indexes = {}
+    mints = set(snapshot_store.available_mints(directory))
+    mints.update(f[:-len("_index.npz")] for f in os.listdir(directory) if f.endswith("_index.npz"))
+    for mint in mints:
+        if tokens is None or mint in tokens:
+            index = load_index(directory, mint)
+            if index is None:
+                index = AmountIndex.from_amounts(snapshot_store.load_amounts(directory, mint), MIN_AMOUNT)
+            indexes[mint] = index
+    for mint in (f[:-len("_holders.json")] for f in os.listdir(directory) if f.endswith("_holders.json")):
+        if mint not in indexes and (tokens is None or mint in tokens):
+            # Incremental days keep only the delta, so the holder set is replayed from the last base
+            holders, decimals, _ = holder_snapshots.load_snapshot(directory, mint)
+            amounts = np.fromiter(holders.values(), dtype=np.uint64, count=len(holders)) / float(10 ** (decimals or 0))
+            indexes[mint] = AmountIndex.from_amounts(amounts, MIN_AMOUNT)
+    token_data_path = os.path.join(directory, "token_data.json")
+    if os.path.exists(token_data_path):
+        with open(token_data_path, 'r') as f:
+            token_data = json.load(f)
+        for mint, accounts in token_data.items():
+            if mint not in indexes and (tokens is None or mint in tokens):
+                amounts = np.array([account['amount_normalized'] for account in accounts], dtype=float)
+                indexes[mint] = AmountIndex.from_amounts(amounts, MIN_AMOUNT)
+    return indexes
+
+def directory_records(directory, tokens=None):
+    date = os.path.basename(os.path.normpath(directory))
+    prices = load_directory_prices(directory)
+    return {mint: build_record(date, index, prices.get(mint, np.nan) / 1_000_000_000)
+            for mint, index in directory_indexes(directory, tokens).items()}
+
+def record_directory(directory, tokens=None, root=TIMESERIES_DIR):
+    records = directory_records(directory, tokens)
+    for mint, record in records.items():
+        write_records(root, mint, [record])
+    print(f"Recorded {len(records)} time-series points for {os.path.basename(os.path.normpath(directory))}")
+    return len(records)
+
+def dated_directories(data_root):
+    return [os.path.join(data_root, name) for name in sorted(os.listdir(data_root))
+            if name.isdigit() and len(name) == 8 and os.path.isdir(os.path.join(data_root, name))]
+
+def backfill(data_root="data", root=TIMESERIES_DIR, max_workers=None):
+    start = time.perf_counter()
+    directories = dated_directories(data_root)
+    by_mint = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for directory, records in zip(directories, pool.map(directory_records, directories)):
+            for mint, record in records.items():
+                by_mint.setdefault(mint, []).append(record)
+    for mint, records in by_mint.items():
+        write_records(root, mint, records)
+    print(f"Backfilled {sum(len(records) for records in by_mint.values())} points for {len(by_mint)} tokens "
+          f"from {len(directories)} days in {time.perf_counter() - start:.1f}s")
+    return by_mint
+
+if __name__ == "__main__":
+    # python timeseries.py [data_root]: rebuild the store from every dated snapshot directory
+    backfill(sys.argv[1] if len(sys.argv) > 1 else "data")
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import time
+import httpx
+import metrics
+from http_client import HostRateLimiter, create_client, get_json
+
+# The one client for Sanctum token metadata and prices, shared by the fetcher, the plotter, the
+# oneshot script and the app. Answers are cached on disk with a TTL per kind: metadata barely
+# changes so it is kept for a week, prices only briefly. Prices for every mint go out as one
+# batched request; metadata has no batch endpoint, so only cache misses are requested, concurrently.
+SANCTUM_URL = os.environ.get("SANCTUM_URL", "https://api.sanctum.so")
+CACHE_DIR = os.environ.get("TOKEN_API_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache"))
+METADATA_TTL = 7 * 24 * 3600
+PRICE_TTL = 60
+# Mints per price request, to keep the query string a sane length
+PRICE_BATCH_SIZE = 50
+
+def cache_path(kind):
+    return os.path.join(CACHE_DIR, f"token_{kind}.json")
+
+def read_cache(kind):
+    try:
+        with open(cache_path(kind), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_cache(kind, entries):
+    # Merged with what is on disk, since another process may have cached other mints meanwhile
+    cache = read_cache(kind)
+    cache.update(entries)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(kind)
+    with open(f"{path}.{os.getpid()}.tmp", 'w') as f:
+        json.dump(cache, f)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+def split_cached(kind, mints, max_age):
+    # Fresh cached values, and the mints that need a request
+    cache = read_cache(kind)
+    now = time.time()
+    fresh = {mint: cache[mint]['value'] for mint in mints if mint in cache and now - cache[mint]['fetched'] <= max_age}
+    missing = [mint for mint in mints if mint not in fresh]
+    metrics.REGISTRY.inc("token_api_cache_hits_total", len(fresh), kind=kind)
+    metrics.REGISTRY.inc("token_api_cache_misses_total", len(missing), kind=kind)
+    return fresh, missing, cache
+
+async def get_metadata(mints, client=None, limiter=None, max_age=METADATA_TTL):
+    # {mint: metadata}; a mint whose request fails gets its stale cached metadata, or None
+    mints = list(dict.fromkeys(mints))
+    results, missing, cache = split_cached("metadata", mints, max_age)
+    if not missing:
+        return {mint: results[mint] for mint in mints}
+    if client is None:
+        async with create_client() as own_client:
+            return await get_metadata(mints, own_client, limiter, max_age)
+    limiter = limiter or HostRateLimiter()
+
+    async def fetch(mint):
+        try:
+            return await get_json(client, limiter, f"{SANCTUM_URL}/v1/metadata/{mint}")
+        except httpx.HTTPError as e:
+            print(f"Failed to fetch metadata for {mint}: {e}")
+            return None
+
+    fetched = dict(zip(missing, await asyncio.gather(*(fetch(mint) for mint in missing))))
+    now = time.time()
+    write_cache("metadata", {mint: {'value': value, 'fetched': now} for mint, value in fetched.items() if value})
+    for mint, value in fetched.items():
+        results[mint] = value or cache.get(mint, {}).get('value')
+    return {mint: results[mint] for mint in mints}
+
+async def get_prices(mints, client=None, limiter=None, max_age=PRICE_TTL):
+    # {mint: price in lamports per token}. Raises when the request fails and nothing was ever cached.
+    mints = list(dict.fromkeys(mints))
+    results, missing, cache = split_cached("prices", mints, max_age)
+    if not missing:
+        return results
+    if client is None:
+        async with create_client() as own_client:
+            return await get_prices(mints, own_client, limiter, max_age)
+    limiter = limiter or HostRateLimiter()
+
+    fetched = {}
+    try:
+        for start in range(0, len(missing), PRICE_BATCH_SIZE):
+            batch = missing[start:start + PRICE_BATCH_SIZE]
+            data = await get_json(client, limiter, f"{SANCTUM_URL}/v1/price", params=[('input', mint) for mint in batch])
+            fetched.update({item['mint']: float(item['amount']) for item in data.get('prices', []) if 'mint' in item and 'amount' in item})
+    except httpx.HTTPError as e:
+        stale = {mint: cache[mint]['value'] for mint in missing if mint in cache and mint not in fetched}
+        if not stale and not fetched:
+            raise
+        print(f"Failed to fetch prices: {e}; using cached prices for {len(stale)} mints")
+        results.update(stale)
+    if fetched:
+        now = time.time()
+        write_cache("prices", {mint: {'value': value, 'fetched': now} for mint, value in fetched.items()})
+    results.update(fetched)
+    return results
+
+def fetch_metadata(mints, max_age=METADATA_TTL):
+    return asyncio.run(get_metadata(mints, max_age=max_age))
+
+def fetch_prices(mints, max_age=PRICE_TTL):
+    return asyncio.run(get_prices(mints, max_age=max_age))
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import metrics
+
+# Kept inside the uploaded directory: digest of every file as of its last successful upload
+UPLOAD_MANIFEST_FILE = ".upload_manifest.json"
+
+MAX_CONCURRENT_UPLOADS = 4
+MAX_ATTEMPTS = 4
+BACKOFF_SECONDS = 2.0
+
+class CommandUploader:
+    # Runs one command per file; "{file}" and "{url}" in the template are filled in per upload
+    def __init__(self, command_template):
+        self.command_template = list(command_template)
+
+    def upload(self, file_path, file_url):
+        command = [part.format(file=file_path, url=file_url) for part in self.command_template]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{command[0]} exited with {result.returncode}: {result.stderr.strip()}")
+
+class HttpUploader:
+    # Sends the file body to an endpoint; "{filename}" in the endpoint is filled in per upload
+    def __init__(self, endpoint, method="PUT", timeout=60):
+        self.endpoint = endpoint
+        self.method = method
+        self.timeout = timeout
+
+    def upload(self, file_path, file_url):
+        url = self.endpoint.format(filename=os.path.basename(file_path))
+        with open(file_path, 'rb') as f:
+            response = requests.request(self.method, url, data=f, timeout=self.timeout)
+        response.raise_for_status()
+
+def shdw_drive_uploader(api_url, keypair_path):
+    return CommandUploader(["shdw-drive", "edit-file", "-r", api_url, "-kp", keypair_path, "-f", "{file}", "-u", "{url}"])
+
+def uploader_from_env(default):
+    # UPLOAD_COMMAND / UPLOAD_ENDPOINT swap the real uploader for a stub command or a local HTTP server
+    if os.environ.get("UPLOAD_COMMAND"):
+        return CommandUploader(shlex.split(os.environ["UPLOAD_COMMAND"]))
+    if os.environ.get("UPLOAD_ENDPOINT"):
+        return HttpUploader(os.environ["UPLOAD_ENDPOINT"])
+    return default
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_manifest(directory):
+    path = os.path.join(directory, UPLOAD_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, UPLOAD_MANIFEST_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def upload_with_retry(uploader, file_path, file_url, attempts=None, backoff=None):
+    attempts = attempts or MAX_ATTEMPTS
+    backoff = BACKOFF_SECONDS if backoff is None else backoff
+    for attempt in range(1, attempts + 1):
+        try:
+            uploader.upload(file_path, file_url)
+            return attempt
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            print(f"Upload of {file_path} failed (attempt {attempt}/{attempts}): {e}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def changed_files(directory, manifest, suffix=".webp"):
+    changed = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(suffix):
+            digest = file_digest(os.path.join(directory, filename))
+            if manifest.get(filename) != digest:
+                changed[filename] = digest
+    return changed
+
+def upload_directory(directory, base_url, uploader, max_workers=MAX_CONCURRENT_UPLOADS, suffix=".webp"):
+    manifest = read_manifest(directory)
+    pending = changed_files(directory, manifest, suffix)
+    lock = threading.Lock()
+    uploaded, failed = [], []
+
+    def upload(filename):
+        file_path = os.path.join(directory, filename)
+        start = time.perf_counter()
+        try:
+            attempts = upload_with_retry(uploader, file_path, f"{base_url}{filename}")
+        except Exception as e:
+            print(f"Giving up on {file_path}: {e}")
+            metrics.REGISTRY.inc("upload_failures_total")
+            metrics.REGISTRY.inc("upload_retries_total", MAX_ATTEMPTS - 1)
+            with lock:
+                failed.append(filename)
+            return
+        metrics.REGISTRY.observe("upload_seconds", time.perf_counter() - start)
+        metrics.REGISTRY.inc("upload_bytes_total", os.path.getsize(file_path))
+        metrics.REGISTRY.inc("upload_retries_total", attempts - 1)
+        with lock:
+            manifest[filename] = pending[filename]
+            uploaded.append(filename)
+            # Persist as we go so an interrupted push does not resend what already landed
+            write_manifest(directory, manifest)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(upload, pending))
+    print(f"Uploaded {len(uploaded)} of {len(pending)} changed files ({len(failed)} failed) in {time.perf_counter() - start:.1f}s")
+    return uploaded, failed
+
+if __name__ == "__main__":
+    # python uploader.py <directory> <base_url>, with UPLOAD_COMMAND or UPLOAD_ENDPOINT set
+    upload_directory(sys.argv[1], sys.argv[2], uploader_from_env(None))